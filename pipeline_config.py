@@ -14,6 +14,7 @@ _DEFAULT_CONFIG: Dict[str, Any] = {
     "pipeline": {
         "debug_mode": False,
         "cleanup_processed": False,
+        "encadear_etapas_18_20": True,
     },
     "etapa14": {
         "usar_gemini_api": False,
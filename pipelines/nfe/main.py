@@ -32,6 +32,12 @@ if str(SRC_DIR) not in sys.path:
 
 class PipelineNFe:
     """Orquestrador do pipeline completo de NFe"""
+
+    # ZIPs intermediários que as etapas 18/19 não gravam quando encadeadas em memória
+    ZIPS_ENCADEADOS = (
+        "data/processed/df_etapa18_sobrepreco.zip",
+        "data/processed/df_etapa19_valores_ajustados.zip",
+    )
     
     def __init__(self):
         self.inicio = datetime.now()
@@ -42,6 +48,9 @@ class PipelineNFe:
         self.pipeline_root = PIPELINE_ROOT
         self.project_root = PROJECT_ROOT
         self.scripts_dir = self.pipeline_root / "scripts"
+        # Etapas 18-20 podem trocar o DataFrame em memória em vez de ZIPs intermediários
+        self.encadear_em_memoria = bool(get_toggle("pipeline", "encadear_etapas_18_20", default=True))
+        self.df_em_memoria = None
     
     def limpar_arquivos_antigos(self):
         """Remove arquivos de processamentos antigos, mantendo apenas os últimos N"""
@@ -65,6 +74,9 @@ class PipelineNFe:
                     'vencimento': 'nfe_vencimento_*.csv',
                     'limpo': 'nfe_limpo_*.csv',
                     'enriquecido': 'nfe_enriquecido_*.csv',
+                    # Caches Parquet da leitura das Etapas 6 e 7 (ao lado do CSV da Etapa 4)
+                    'enriquecido_cache': 'nfe_enriquecido_*.parquet',
+                    'etapa04_cache': 'nfe_etapa04_enriquecido*.parquet',
                     'matched': 'nfe_matched_*.csv',
                     'matched_manual': 'nfe_matched_manual_*.csv',
                     'completo': 'df_completo_*.zip',
@@ -89,7 +101,7 @@ class PipelineNFe:
                     'etapa19_resumo': 'df_etapa19_resumo_ajuste*.csv',
                     'etapa20_classificacao': 'df_etapa20_classificacao_esfera*.zip',
                     'etapa20_distribuicao': 'df_etapa20_distribuicao_esfera*.csv',
-                    'etapa21_unidades': 'df_etapa21_unidades_padronizadas*.zip',
+                    'etapa21_unidades': 'df_etapa21_unidades_padronizadas*.parquet',
                     'etapa21_resumo': 'df_etapa21_unidades_resumo*.csv',
                     'etapa21_metricas': 'df_etapa21_unidades_metricas*.csv',
                     'etapa22_central': 'QlikView/df_central.csv',
@@ -166,6 +178,28 @@ class PipelineNFe:
         except Exception as e:
             self.log_erro(nome_etapa, str(e))
             return False
+
+    def remover_zips_encadeados(self):
+        """Remove os ZIPs das etapas 18/19 deixados por execuções anteriores"""
+        for arquivo in self.ZIPS_ENCADEADOS:
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+                print(f"[INFO] ZIP desatualizado removido: {os.path.basename(arquivo)}")
+
+    def avisar_reexecucao_encadeada(self):
+        """Orienta a reexecução avulsa após falha no encadeamento 18-20"""
+        if self.encadear_em_memoria:
+            print("[INFO] Etapas 18-20 encadeadas em memória (sem ZIPs 18/19): "
+                  "para reexecutar isoladamente, comece por scripts/processar_etapa18_sobrepreco.py")
+
+    def executar_em_processo(self, funcao, nome_etapa, **kwargs):
+        """Executa a função de uma etapa no próprio processo e retorna o DataFrame gerado"""
+        try:
+            print(f"\n[EXECUTANDO] {nome_etapa}... (em memória)")
+            return funcao(**kwargs)
+        except Exception as e:
+            self.log_erro(nome_etapa, str(e))
+            return None
     
     def etapa_1_carregamento(self):
         """Etapa 1: Carregamento e pré-processamento de NFe"""
@@ -553,7 +587,7 @@ class PipelineNFe:
                 raise Exception("Script de extração de nomes falhou")
             
             # Encontrar arquivo gerado
-            arquivos = glob.glob("data/processed/df_etapa10_trabalhando_nomes.zip")
+            arquivos = glob.glob("data/processed/df_etapa10_trabalhando_nomes.parquet")
             if not arquivos:
                 raise Exception("Arquivo de extração não foi gerado")
             
@@ -590,7 +624,7 @@ class PipelineNFe:
                 raise Exception("Script de refinamento falhou")
             
             # Encontrar arquivo gerado
-            arquivos = glob.glob("data/processed/df_etapa11_trabalhando_refinado.zip")
+            arquivos = glob.glob("data/processed/df_etapa11_trabalhando_refinado.parquet")
             if not arquivos:
                 raise Exception("Arquivo de refinamento não foi gerado")
             
@@ -860,19 +894,31 @@ class PipelineNFe:
         print("="*60)
 
         try:
-            sucesso = self.executar_script(
-                self.scripts_dir / "processar_etapa18_sobrepreco.py",
-                "Análise de Sobrepreço"
-            )
+            if self.encadear_em_memoria:
+                from nfe_etapa18_sobrepreco import processar as processar_etapa18
+
+                # Sem os ZIPs 18/19 desta execução, os de uma execução anterior
+                # seriam lidos por reexecuções avulsas das etapas 19/20
+                self.remover_zips_encadeados()
+                self.df_em_memoria = self.executar_em_processo(
+                    processar_etapa18, "Análise de Sobrepreço", salvar=False
+                )
+                sucesso = self.df_em_memoria is not None
+            else:
+                sucesso = self.executar_script(
+                    self.scripts_dir / "processar_etapa18_sobrepreco.py",
+                    "Análise de Sobrepreço"
+                )
 
             if not sucesso:
                 raise Exception("Script de sobrepreço falhou")
 
             arquivos = [
-                "data/processed/df_etapa18_sobrepreco.zip",
                 "data/processed/df_etapa18_sobrepreco_resumo.csv",
                 "data/processed/df_etapa18_sobrepreco_stats.csv",
             ]
+            if not self.encadear_em_memoria:
+                arquivos.insert(0, "data/processed/df_etapa18_sobrepreco.zip")
             for arquivo in arquivos:
                 if os.path.exists(arquivo):
                     self.log_arquivo(arquivo)
@@ -896,18 +942,25 @@ class PipelineNFe:
         print("="*60)
 
         try:
-            sucesso = self.executar_script(
-                self.scripts_dir / "processar_etapa19_ajuste_inflacionario.py",
-                "Ajuste Inflacionário"
-            )
+            if self.encadear_em_memoria:
+                from nfe_etapa19_ajuste_inflacionario import processar as processar_etapa19
+
+                self.df_em_memoria = self.executar_em_processo(
+                    processar_etapa19, "Ajuste Inflacionário", df=self.df_em_memoria, salvar=False
+                )
+                sucesso = self.df_em_memoria is not None
+            else:
+                sucesso = self.executar_script(
+                    self.scripts_dir / "processar_etapa19_ajuste_inflacionario.py",
+                    "Ajuste Inflacionário"
+                )
 
             if not sucesso:
                 raise Exception("Script de ajuste inflacionário falhou")
 
-            arquivos = [
-                "data/processed/df_etapa19_valores_ajustados.zip",
-                "data/processed/df_etapa19_resumo_ajuste.csv",
-            ]
+            arquivos = ["data/processed/df_etapa19_resumo_ajuste.csv"]
+            if not self.encadear_em_memoria:
+                arquivos.insert(0, "data/processed/df_etapa19_valores_ajustados.zip")
             for arquivo in arquivos:
                 if os.path.exists(arquivo):
                     self.log_arquivo(arquivo)
@@ -920,6 +973,7 @@ class PipelineNFe:
             duracao = (datetime.now() - inicio).total_seconds()
             self.log_etapa(19, "Ajuste Inflacionário (IGP-DI)", "ERRO", duracao)
             self.log_erro("Etapa 19", str(e))
+            self.avisar_reexecucao_encadeada()
             return False
 
     def etapa_20_classificacao_esfera(self):
@@ -931,10 +985,21 @@ class PipelineNFe:
         print("="*60)
 
         try:
-            sucesso = self.executar_script(
-                self.scripts_dir / "processar_etapa20_classificacao_esfera.py",
-                "Classificação por Esfera"
-            )
+            if self.encadear_em_memoria:
+                from nfe_etapa20_classificacao_esfera import processar as processar_etapa20
+
+                # Última etapa do encadeamento: materializa o ZIP lido pela etapa 21
+                df_esfera = self.executar_em_processo(
+                    processar_etapa20, "Classificação por Esfera", df=self.df_em_memoria, salvar=True
+                )
+                self.df_em_memoria = None
+                sucesso = df_esfera is not None
+                del df_esfera
+            else:
+                sucesso = self.executar_script(
+                    self.scripts_dir / "processar_etapa20_classificacao_esfera.py",
+                    "Classificação por Esfera"
+                )
 
             if not sucesso:
                 raise Exception("Script de classificação por esfera falhou")
@@ -955,6 +1020,7 @@ class PipelineNFe:
             duracao = (datetime.now() - inicio).total_seconds()
             self.log_etapa(20, "Classificação por Esfera", "ERRO", duracao)
             self.log_erro("Etapa 20", str(e))
+            self.avisar_reexecucao_encadeada()
             return False
 
     def etapa_21_padronizacao_unidades(self):
@@ -975,7 +1041,7 @@ class PipelineNFe:
                 raise Exception("Script de padronização de unidades falhou")
 
             arquivos = [
-                "data/processed/df_etapa21_unidades_padronizadas.zip",
+                "data/processed/df_etapa21_unidades_padronizadas.parquet",
                 "data/processed/df_etapa21_unidades_resumo.csv",
                 "data/processed/df_etapa21_unidades_metricas.csv",
             ]
@@ -1021,9 +1087,10 @@ class PipelineNFe:
                 "QlikView/nfe_vencimento.csv",
             ]
             for arquivo in arquivos:
-                caminho = self.project_root / arquivo
-                if caminho.exists():
-                    self.log_arquivo(str(caminho))
+                # QV_FMT=parquet grava as mesmas tabelas com extensão .parquet
+                for caminho in (self.project_root / arquivo, (self.project_root / arquivo).with_suffix(".parquet")):
+                    if caminho.exists():
+                        self.log_arquivo(str(caminho))
 
             duracao = (datetime.now() - inicio).total_seconds()
             self.log_etapa(22, "Particionamento QlikView", "SUCESSO", duracao)
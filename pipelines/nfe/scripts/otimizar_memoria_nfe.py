@@ -5,7 +5,6 @@ Parte da Etapa 6 do pipeline
 
 import sys
 import os
-import glob
 from pathlib import Path
 
 # Adicionar src ao path
@@ -14,8 +13,7 @@ SRC_DIR = CURRENT_DIR.parent / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-import pandas as pd
-from nfe_etapa06_otimizacao_memoria import preparar_nfe_para_matching
+from paths import encontrar_mais_recente
 
 
 def main():
@@ -30,12 +28,16 @@ def main():
     if not os.path.exists(arquivo_path):
         # Fallback: procura com timestamp
         pattern = os.path.join(data_dir, "nfe_enriquecido_*.csv")
-        arquivos = glob.glob(pattern)
-        if not arquivos:
+        arquivo_path = encontrar_mais_recente(data_dir, "nfe_enriquecido_", ".csv")
+        if arquivo_path is None:
             print(f"[ERRO] Nenhum arquivo de NFe enriquecido encontrado em: {pattern}")
             print("[INFO] Execute as etapas anteriores do pipeline primeiro")
             return False
-        arquivo_path = max(arquivos, key=os.path.getmtime)
+    
+    # pandas/pyarrow só depois de achar a entrada (sem arquivo o script encerra antes)
+    import pyarrow as pa
+    from leitura_csv import ler_csv_com_cache
+    from nfe_etapa06_otimizacao_memoria import preparar_nfe_para_matching
     
     # Usar arquivo
     arquivo_entrada = arquivo_path
@@ -43,7 +45,9 @@ def main():
     
     # Carregar dados
     try:
-        df = pd.read_csv(arquivo_entrada, sep=';', encoding='utf-8-sig')
+        # Parser do Arrow (descarta o BOM do utf-8-sig) com o mesmo cache
+        # Parquet usado pelo matching da Etapa 7
+        df = ler_csv_com_cache(arquivo_entrada, {'chave_codigo': pa.string()})
         print(f"[OK] {len(df):,} registros carregados\n")
     except Exception as e:
         print(f"[ERRO] Falha ao carregar arquivo: {str(e)}")
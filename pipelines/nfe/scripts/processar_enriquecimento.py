@@ -4,7 +4,6 @@ Script de processamento de enriquecimento de dados de NFe com informações de m
 
 import sys
 import os
-import glob
 from pathlib import Path
 
 # Adicionar src da pipeline ao path
@@ -13,22 +12,20 @@ SRC_DIR = CURRENT_DIR.parent / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-from nfe_etapa04_enriquecimento import processar_enriquecimento_nfe
-
 
 def main():
     """Função principal"""
     try:
         # Encontrar arquivo limpo mais recente
-        arquivos = glob.glob("data/processed/nfe_etapa03_limpo.csv")
+        arquivo_entrada = "data/processed/nfe_etapa03_limpo.csv"
         
-        if not arquivos:
+        if not os.path.exists(arquivo_entrada):
             print("[ERRO] Nenhum arquivo limpo encontrado em data/processed/")
             print("[INFO] Execute primeiro: python scripts/processar_limpeza.py")
             sys.exit(1)
         
-        # Pegar o mais recente
-        arquivo_entrada = max(arquivos, key=os.path.getmtime)
+        # pandas e o módulo da etapa só depois de achar a entrada
+        from nfe_etapa04_enriquecimento import processar_enriquecimento_nfe
         
         # Processar enriquecimento
         df_enriquecido, caminho_saida = processar_enriquecimento_nfe(arquivo_entrada)
@@ -5,7 +5,6 @@ Etapa 3 do pipeline
 
 import sys
 import os
-import glob
 from pathlib import Path
 
 # Adicionar src da pipeline ao path
@@ -21,16 +20,13 @@ def main():
     """Função principal"""
     try:
         # Encontrar arquivo processado mais recente (carregamento)
-        arquivos = glob.glob("data/processed/nfe_etapa01_processado.csv")
+        arquivo_entrada = "data/processed/nfe_etapa01_processado.csv"
         
-        if not arquivos:
+        if not os.path.exists(arquivo_entrada):
             print("[ERRO] Nenhum arquivo processado encontrado em data/processed/")
             print("[INFO] Execute primeiro: python scripts/processar_nfe.py")
             sys.exit(1)
         
-        # Pegar o mais recente
-        arquivo_entrada = max(arquivos, key=os.path.getmtime)
-        
         # Processar limpeza
         df_limpo, caminho_saida = processar_limpeza_nfe(arquivo_entrada)
         
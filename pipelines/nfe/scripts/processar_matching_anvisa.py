@@ -5,7 +5,6 @@ Parte da Etapa 7 do pipeline
 
 import sys
 import os
-import glob
 from pathlib import Path
 
 # Adicionar diretórios src das pipelines ao path
@@ -18,10 +17,7 @@ for extra_path in (NFE_SRC, ANVISA_SRC):
     if str(extra_path) not in sys.path:
         sys.path.insert(0, str(extra_path))
 
-import pandas as pd
-from datetime import datetime
-from nfe_etapa07_matching_anvisa import processar_matching_anvisa
-from anvisa_base import processar_base_anvisa
+from paths import encontrar_mais_recente
 
 
 def main():
@@ -40,17 +36,25 @@ def main():
     if not os.path.exists(arquivo_nfe):
         # Fallback: procura com timestamp
         pattern = os.path.join(data_dir, "nfe_enriquecido_*.csv")
-        arquivos_nfe = glob.glob(pattern)
-        if not arquivos_nfe:
+        arquivo_nfe = encontrar_mais_recente(data_dir, "nfe_enriquecido_", ".csv")
+        if arquivo_nfe is None:
             print(f"[ERRO] Nenhum arquivo de NFe enriquecido encontrado em: {pattern}")
             print("[INFO] Execute as etapas anteriores do pipeline primeiro")
             return False
-        arquivo_nfe = max(arquivos_nfe, key=os.path.getctime)
+    
+    # Módulos pesados (pandas, pyarrow, matching) só depois de achar a entrada:
+    # sem arquivo o script encerra sem pagar esses imports
+    import pyarrow as pa
+    from nfe_etapa07_matching_anvisa import processar_matching_anvisa
+    from anvisa_base import processar_base_anvisa
+    from leitura_csv import escrever_csv_arrow, ler_csv_com_cache
     
     print(f"[INFO] Carregando NFe enriquecido: {os.path.basename(arquivo_nfe)}")
     
     try:
-        df_nfe = pd.read_csv(arquivo_nfe, sep=';', encoding='utf-8-sig')
+        # Parser multithread do Arrow (o BOM do utf-8-sig é descartado) com
+        # cache Parquet ao lado do CSV para as próximas execuções
+        df_nfe = ler_csv_com_cache(arquivo_nfe, {'chave_codigo': pa.string()})
         print(f"[OK] {len(df_nfe):,} registros de NFe carregados\n")
     except Exception as e:
         print(f"[ERRO] Falha ao carregar NFe: {str(e)}")
@@ -77,9 +81,10 @@ def main():
         
         # Salvar resultado
         print(f"\n[INFO] Salvando dados com matching em: {arquivo_saida}")
-        df_matched.to_csv(arquivo_saida, sep=';', index=False, encoding='utf-8-sig')
+        # Mesmo arquivo do to_csv, com as linhas montadas pelos kernels do Arrow
+        tamanho_bytes = escrever_csv_arrow(df_matched, arquivo_saida, delimitador=';', encoding='utf-8-sig')
         
-        tamanho_mb = os.path.getsize(arquivo_saida) / (1024 * 1024)
+        tamanho_mb = tamanho_bytes / (1024 * 1024)
         print(f"[OK] Arquivo salvo com sucesso ({tamanho_mb:.1f} MB)")
         
         print("\n" + "="*60)
@@ -5,7 +5,6 @@ Etapa 8: Matching com base manual do Google Sheets
 
 import sys
 import os
-import glob
 from pathlib import Path
 
 # Adicionar src da pipeline ao path
@@ -14,7 +13,7 @@ SRC_DIR = CURRENT_DIR.parent / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-from nfe_etapa08_matching_manual import processar_matching_manual
+from paths import encontrar_mais_recente
 
 
 def main():
@@ -30,15 +29,17 @@ def main():
     
     if not os.path.exists(arquivo_entrada):
         # Fallback: procura com timestamp
-        arquivos_matched = glob.glob("data/processed/nfe_matched_*.csv")
-        if not arquivos_matched:
+        arquivo_entrada = encontrar_mais_recente("data/processed", "nfe_matched_", ".csv")
+        if arquivo_entrada is None:
             print("[ERRO] Nenhum arquivo nfe_matched encontrado!")
             print("\nExecute primeiro as etapas 1-7 do pipeline.")
             sys.exit(1)
-        arquivo_entrada = max(arquivos_matched, key=os.path.getmtime)
     
     print(f"[OK] Arquivo encontrado: {os.path.basename(arquivo_entrada)}\n")
     
+    # pandas e o módulo da etapa só depois de achar a entrada
+    from nfe_etapa08_matching_manual import processar_matching_manual
+    
     try:
         # Processar matching manual
         df, arquivo_saida = processar_matching_manual(arquivo_entrada)
@@ -4,7 +4,6 @@ Script para processar e separar dados de vencimento de Notas Fiscais
 
 import sys
 import os
-import glob
 from pathlib import Path
 import pandas as pd
 
@@ -16,6 +15,9 @@ if str(SRC_DIR) not in sys.path:
 
 from nfe_etapa02_vencimento import processar_vencimento_nfe, salvar_dados_vencimento
 
+# Colunas de entrada de processar_vencimento_nfe
+COLUNAS_VENCIMENTO = {'id_data_fabricacao', 'id_data_validade', 'data_emissao', 'chave_codigo'}
+
 
 def main():
     """Executa pipeline de processamento de vencimento"""
@@ -25,20 +27,24 @@ def main():
     print("="*60 + "\n")
     
     # Encontrar arquivo processado mais recente
-    arquivos = glob.glob("data/processed/nfe_etapa01_processado.csv")
+    arquivo_entrada = "data/processed/nfe_etapa01_processado.csv"
     
-    if not arquivos:
+    if not os.path.exists(arquivo_entrada):
         print("[ERRO] Nenhum arquivo processado encontrado em data/processed/")
         print("[INFO] Execute primeiro: python scripts/processar_nfe.py")
         return
     
-    arquivo_entrada = max(arquivos, key=os.path.getmtime)
     print(f"[INFO] Arquivo de entrada: {arquivo_entrada}\n")
     
     try:
         # Carregar dados
         print("[INFO] Carregando dados...")
-        df = pd.read_csv(arquivo_entrada, sep=';', dtype=str)
+        # Só as colunas usadas pela tabela de vencimento (o df_base não é salvo
+        # aqui): as demais são tokenizadas mas não viram objetos Python
+        df = pd.read_csv(
+            arquivo_entrada, sep=';', dtype=str,
+            usecols=lambda coluna: coluna in COLUNAS_VENCIMENTO
+        )
         print(f"[OK] {len(df):,} registros carregados\n")
         
         # Processar vencimento
@@ -7,6 +7,9 @@ import sys
 import os
 import glob
 
+# Únicas colunas usadas nas validações (as demais nem chegam a ser convertidas)
+COLUNAS_VALIDACAO = {'descricao_produto', 'quantidade', 'valor_produtos', 'data_emissao'}
+
 
 def validar_dados_limpos(arquivo_csv):
     """Valida dados limpos processados"""
@@ -17,7 +20,7 @@ def validar_dados_limpos(arquivo_csv):
     print(f"Arquivo: {arquivo_csv}\n")
     
     # Carregar dados
-    df = pd.read_csv(arquivo_csv, sep=';')
+    df = pd.read_csv(arquivo_csv, sep=';', usecols=lambda coluna: coluna in COLUNAS_VALIDACAO)
     
     # Validações
     validacoes = []
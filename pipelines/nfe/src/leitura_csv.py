@@ -0,0 +1,267 @@
+"""Leitura de CSVs do pipeline NFe com o parser multithread do Arrow e de
+Parquets intermediários com os tipos que o CSV equivalente teria; escrita de
+CSVs idênticos aos do ``to_csv`` do pandas com os kernels do Arrow."""
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+# Blocos de 8 MiB: cada bloco é tokenizado por uma thread
+TAMANHO_BLOCO = 8 << 20
+# Formato que nunca casa: desliga a inferência de timestamps (datas ficam como texto)
+SEM_TIMESTAMPS = ["%%"]
+# Linhas montadas por lote na escrita (limita a memória do texto gerado)
+LINHAS_POR_LOTE = 200_000
+# Textos que o parser C do pandas lê como nulos (``na_values`` padrão)
+NULOS_CSV = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+])
+# Metadados do cache Parquet: tamanho e mtime (ns) do CSV de origem
+CHAVE_CACHE_TAMANHO = b"csv_tamanho"
+CHAVE_CACHE_MTIME = b"csv_mtime_ns"
+
+
+def ler_csv_arrow(
+    fonte: Union[str, Path, BinaryIO],
+    tipos: Optional[Dict[str, pa.DataType]] = None,
+    delimitador: str = ";",
+) -> pd.DataFrame:
+    """Lê ``fonte`` (caminho ou arquivo binário, ex. ``zf.open``) como o parser C do pandas.
+
+    O texto de cada valor é preservado onde o Arrow divergiria do pandas:
+    datas ISO (date32) voltam a texto, colunas sem nenhum valor viram float64
+    e nulos de colunas de texto viram NaN (o Arrow devolve None). Os textos
+    lidos como nulos são os ``na_values`` padrão do pandas (``NULOS_CSV``).
+    Colunas que o Arrow leria como número mas o pandas manteria como texto
+    (ex. ``chave_codigo`` de 44 dígitos) devem vir em ``tipos``.
+    """
+    tabela = pv.read_csv(
+        fonte,
+        read_options=pv.ReadOptions(use_threads=True, block_size=TAMANHO_BLOCO),
+        parse_options=pv.ParseOptions(delimiter=delimitador, newlines_in_values=True),
+        convert_options=pv.ConvertOptions(
+            column_types=tipos or {},
+            null_values=list(NULOS_CSV),
+            strings_can_be_null=True,
+            timestamp_parsers=SEM_TIMESTAMPS,
+        ),
+    )
+    for indice, campo in enumerate(tabela.schema):
+        if pa.types.is_date(campo.type):
+            tabela = tabela.set_column(indice, campo.name, tabela.column(indice).cast(pa.string()))
+        elif pa.types.is_null(campo.type):
+            tabela = tabela.set_column(indice, campo.name, tabela.column(indice).cast(pa.float64()))
+    colunas_com_nulos = [
+        campo.name
+        for campo in tabela.schema
+        if pa.types.is_string(campo.type) and tabela.column(campo.name).null_count
+    ]
+    df = tabela.to_pandas()
+    del tabela
+
+    for coluna in colunas_com_nulos:
+        serie = df[coluna]
+        df[coluna] = serie.where(serie.notna(), np.nan)
+    return df
+
+
+def _inicio_dados_zip(mapa: mmap.mmap, info: zipfile.ZipInfo) -> int:
+    """Posição do primeiro byte de dados de ``info`` (após o cabeçalho local)."""
+    tamanho_nome, tamanho_extra = struct.unpack_from("<HH", mapa, info.header_offset + 26)
+    return info.header_offset + 30 + tamanho_nome + tamanho_extra
+
+
+def ler_csv_zip_arrow(
+    caminho_zip: Union[str, Path],
+    tipos: Optional[Dict[str, pa.DataType]] = None,
+    delimitador: str = ";",
+) -> pd.DataFrame:
+    """Lê o primeiro CSV de um ZIP com ``ler_csv_arrow``.
+
+    Membros sem compressão (ZIP_STORED) são lidos direto de um ``mmap`` do ZIP,
+    sem copiar o conteúdo para a memória do Python; os comprimidos seguem em
+    streaming pelo ``zf.open``.
+    """
+    with zipfile.ZipFile(caminho_zip, "r") as zf:
+        info = next((i for i in zf.infolist() if i.filename.lower().endswith(".csv")), None)
+        if info is None:
+            raise ValueError(f"Nenhum CSV encontrado dentro de {Path(caminho_zip).name}.")
+        if info.compress_type != zipfile.ZIP_STORED or info.file_size == 0:
+            with zf.open(info) as csv_file:
+                return ler_csv_arrow(csv_file, tipos, delimitador)
+
+    with open(caminho_zip, "rb") as arquivo:
+        mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        inicio = _inicio_dados_zip(mapa, info)
+        buffer = pa.py_buffer(mapa).slice(inicio, info.file_size)
+        df = ler_csv_arrow(pa.BufferReader(buffer), tipos, delimitador)
+        # O mmap só pode ser fechado sem referências Arrow ao seu conteúdo
+        del buffer
+    finally:
+        mapa.close()
+    return df
+
+
+def ler_parquet_como_csv(caminho: Union[str, Path]) -> pd.DataFrame:
+    """Lê um Parquet intermediário alinhado às convenções do parser C do pandas.
+
+    Colunas de texto/categóricas voltam a ``object``; nulos (o Parquet devolve
+    None) e textos que o ``read_csv`` leria como nulos (``''``, ``'NA'``...)
+    viram NaN, como se o frame tivesse passado por um CSV.
+    """
+    df = pd.read_parquet(caminho, engine="pyarrow")
+    for coluna in df.columns:
+        serie = df[coluna]
+        if serie.dtype == object or isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype(object)
+            df[coluna] = serie.where(serie.notna() & ~serie.isin(NULOS_CSV), np.nan)
+    return df
+
+
+def ler_csv_com_cache(
+    caminho_csv: Union[str, Path],
+    tipos: Optional[Dict[str, pa.DataType]] = None,
+    delimitador: str = ";",
+) -> pd.DataFrame:
+    """Lê um CSV intermediário reaproveitando um Parquet irmão (mesmo nome, ``.parquet``).
+
+    O Parquet guarda nos metadados o tamanho e o mtime (ns) do CSV de origem e
+    só é usado (com ``ler_parquet_como_csv``) se os dois ainda baterem; senão o
+    CSV é lido com ``ler_csv_arrow`` e o Parquet (zstd) é regravado. Falhas ao
+    gravar o cache não interrompem a leitura. Usado só para o CSV da Etapa 4,
+    lido pelas Etapas 6 e 7.
+    """
+    caminho_csv = Path(caminho_csv)
+    caminho_parquet = caminho_csv.with_suffix(".parquet")
+    estado_csv = caminho_csv.stat()
+    origem = {
+        CHAVE_CACHE_TAMANHO: str(estado_csv.st_size).encode(),
+        CHAVE_CACHE_MTIME: str(estado_csv.st_mtime_ns).encode(),
+    }
+    try:
+        metadados = pq.read_schema(caminho_parquet).metadata or {}
+        cache_valido = all(metadados.get(chave) == valor for chave, valor in origem.items())
+    except (OSError, pa.ArrowException):
+        cache_valido = False
+    if cache_valido:
+        print(f"[INFO] Usando cache Parquet: {caminho_parquet.name}")
+        return ler_parquet_como_csv(caminho_parquet)
+
+    df = ler_csv_arrow(caminho_csv, tipos, delimitador)
+    try:
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), **origem})
+        pq.write_table(tabela, caminho_parquet, compression="zstd", compression_level=3)
+        del tabela
+        print(f"[INFO] Cache Parquet gravado: {caminho_parquet.name}")
+    except (OSError, pa.ArrowException) as e:
+        print(f"[AVISO] Cache Parquet não gravado ({caminho_parquet.name}): {e}")
+        try:
+            os.remove(caminho_parquet)
+        except OSError:
+            pass
+    return df
+
+
+def _citar(textos: pa.Array, especiais: str) -> pa.Array:
+    """Aspas do QUOTE_MINIMAL do módulo csv nos textos que casam ``especiais``
+    (delimitador, aspas ou caracteres do terminador); aspas internas são duplicadas."""
+    precisa = pc.match_substring_regex(textos, especiais)
+    if not pc.any(precisa).as_py():
+        return textos
+    citados = pc.binary_join_element_wise('"', pc.replace_substring(textos, '"', '""'), '"', "")
+    return pc.if_else(precisa, citados, textos)
+
+
+def _textos_coluna(serie: pd.Series, especiais: str) -> pa.Array:
+    """Campo de cada valor de ``serie`` como o ``to_csv`` escreveria (nulos ficam nulos).
+
+    A formatação e as aspas são calculadas só sobre os valores distintos e
+    expandidas pelos códigos do factorize: textos vão direto para o Arrow
+    ('' vira nulo, o to_csv escreve os dois como campo vazio), floats com
+    repr como o módulo csv e os demais tipos pelo próprio pandas (ex. datas
+    só com o dia quando todas são meia-noite). Levanta ``TypeError`` para
+    colunas object com valores que não são texto.
+    """
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in "iu":
+        # Inteiros numpy: o texto decimal do Arrow é o mesmo do pandas
+        return pc.cast(pa.array(serie.to_numpy()), pa.string())
+
+    dtype = serie.dtype.categories.dtype if isinstance(serie.dtype, pd.CategoricalDtype) else serie.dtype
+    codigos, unicos = pd.factorize(serie)
+    if dtype == object or isinstance(dtype, pd.StringDtype):
+        try:
+            textos = pa.array(np.asarray(unicos, dtype=object), type=pa.string())
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as e:
+            raise TypeError(f"coluna '{serie.name}' mistura texto e outros tipos") from e
+        textos = pc.if_else(pc.equal(textos, ""), pa.scalar(None, pa.string()), textos)
+    elif dtype == np.float64:
+        textos = pa.array([repr(valor) for valor in np.asarray(unicos).tolist()], type=pa.string())
+    else:
+        formatados = pd.Series(unicos).to_csv(header=False, index=False, lineterminator="\n")
+        textos = pa.array(formatados.split("\n")[: len(unicos)], type=pa.string())
+    return _citar(textos, especiais).take(pa.array(codigos, mask=codigos < 0))
+
+
+def escrever_csv_arrow(
+    df: pd.DataFrame,
+    caminho: Union[str, Path],
+    delimitador: str = ";",
+    encoding: str = "utf-8-sig",
+) -> int:
+    """Grava ``df`` byte a byte como ``df.to_csv(caminho, sep=delimitador, index=False, encoding=encoding)``
+    e devolve o tamanho do arquivo em bytes.
+
+    Cada coluna vira um array de campos já citados e as linhas são montadas em
+    lotes pelos kernels do Arrow; o buffer de cada lote vai direto para o
+    arquivo. Casos fora desse caminho (outro encoding, uma coluna só, colunas
+    object com valores não textuais) usam o próprio ``to_csv``.
+    """
+    codificacao = encoding.lower().replace("_", "-")
+    if codificacao not in ("utf-8", "utf8", "utf-8-sig") or len(df.columns) < 2:
+        df.to_csv(caminho, sep=delimitador, index=False, encoding=encoding)
+        return os.path.getsize(caminho)
+
+    terminador = os.linesep
+    especiais = "[" + re.escape(delimitador + '"' + terminador) + "]"
+    try:
+        colunas = [_textos_coluna(df.iloc[:, i], especiais) for i in range(len(df.columns))]
+    except TypeError:
+        df.to_csv(caminho, sep=delimitador, index=False, encoding=encoding)
+        return os.path.getsize(caminho)
+
+    cabecalho = _citar(pa.array([str(nome) for nome in df.columns], type=pa.string()), especiais)
+    with open(caminho, "wb") as arquivo:
+        if codificacao == "utf-8-sig":
+            arquivo.write("\ufeff".encode("utf-8"))
+        arquivo.write((delimitador.join(cabecalho.to_pylist()) + terminador).encode("utf-8"))
+        for inicio in range(0, len(df), LINHAS_POR_LOTE):
+            linhas = pc.binary_join_element_wise(
+                *[coluna.slice(inicio, LINHAS_POR_LOTE) for coluna in colunas],
+                delimitador,
+                null_handling="replace",
+                null_replacement="",
+            )
+            linhas = pc.binary_join_element_wise(linhas, "", terminador)
+            # As linhas já estão concatenadas no buffer de dados, entre o
+            # primeiro e o último offset
+            offsets = np.frombuffer(linhas.buffers()[1], dtype=np.int32)
+            offsets = offsets[linhas.offset : linhas.offset + len(linhas) + 1]
+            arquivo.write(memoryview(linhas.buffers()[2])[offsets[0] : offsets[-1]])
+        # Posição final do arquivo: o tamanho sem um stat do arquivo recém-gravado
+        return arquivo.tell()
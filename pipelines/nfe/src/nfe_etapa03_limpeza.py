@@ -396,17 +396,15 @@ def processar_limpeza_nfe(arquivo_entrada):
 # ============================================================
 
 if __name__ == "__main__":
-    import glob
+    from paths import encontrar_mais_recente
     
     # Encontrar arquivo processado (carregamento)
     arquivo_entrada = "data/processed/nfe_etapa01_processado.csv"
     
     if not os.path.exists(arquivo_entrada):
         # Fallback: procura com padrão antigo para compatibilidade
-        arquivos = glob.glob("data/processed/nfe_processado_*.csv")
-        if arquivos:
-            arquivo_entrada = max(arquivos, key=os.path.getmtime)
-        else:
+        arquivo_entrada = encontrar_mais_recente("data/processed", "nfe_processado_", ".csv")
+        if arquivo_entrada is None:
             print("[ERRO] Nenhum arquivo processado encontrado!")
             print("[INFO] Execute primeiro: python scripts/processar_nfe.py")
             exit(1)
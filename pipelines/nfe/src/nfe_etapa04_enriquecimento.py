@@ -10,7 +10,7 @@ from typing import Any, Dict
 import pandas as pd
 import requests
 
-from paths import SUPPORT_DIR
+from paths import SUPPORT_DIR, encontrar_mais_recente
 
 
 # ============================================================
@@ -253,17 +253,13 @@ def processar_enriquecimento_nfe(arquivo_entrada):
 # ============================================================
 
 if __name__ == "__main__":
-    import glob
-    
     # Encontrar arquivo limpo (limpeza)
     arquivo_entrada = "data/processed/nfe_etapa03_limpo.csv"
     
     if not os.path.exists(arquivo_entrada):
         # Fallback: procura com padrão antigo para compatibilidade
-        arquivos = glob.glob("data/processed/nfe_limpo_*.csv")
-        if arquivos:
-            arquivo_entrada = max(arquivos, key=os.path.getmtime)
-        else:
+        arquivo_entrada = encontrar_mais_recente("data/processed", "nfe_limpo_", ".csv")
+        if arquivo_entrada is None:
             print("[ERRO] Nenhum arquivo limpo encontrado!")
             print("[INFO] Execute primeiro: python scripts/processar_limpeza.py")
             exit(1)
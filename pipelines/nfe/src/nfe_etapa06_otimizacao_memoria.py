@@ -3,6 +3,7 @@ Módulo de otimização de memória para DataFrames
 Reduz uso de memória através de conversão de tipos e remoção de colunas
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -21,9 +22,11 @@ def otimizar_memoria_dataframe(df, nome="DataFrame"):
     print(f"[INICIO] Otimização de Memória - {nome}")
     print("="*60 + "\n")
     
-    # Medir memória inicial
+    # Medir memória inicial (por coluna: as colunas que não mudarem não são
+    # medidas de novo no final, o deep=True percorre cada texto)
     print("--- ANÁLISE INICIAL ---")
-    initial_mem = df.memory_usage(deep=True).sum() / 1024**2
+    mem_colunas = df.memory_usage(deep=True)
+    initial_mem = mem_colunas.sum() / 1024**2
     print(f"Uso de memória inicial: {initial_mem:.2f} MB")
     print(f"Registros: {len(df):,}")
     print(f"Colunas: {len(df.columns)}")
@@ -54,7 +57,8 @@ def otimizar_memoria_dataframe(df, nome="DataFrame"):
     print("\n[INFO] Otimizando colunas numéricas (downcast)...")
     int_cols = df.select_dtypes(include=['int64']).columns
     if len(int_cols) > 0:
-        df[int_cols] = df[int_cols].apply(pd.to_numeric, downcast='integer')
+        for col in int_cols:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
         print(f"[OK] {len(int_cols)} colunas inteiras otimizadas")
     else:
         print("[INFO] Nenhuma coluna int64 encontrada")
@@ -62,14 +66,18 @@ def otimizar_memoria_dataframe(df, nome="DataFrame"):
     # Downcast de floats
     float_cols = df.select_dtypes(include=['float64']).columns
     if len(float_cols) > 0:
-        df[float_cols] = df[float_cols].apply(pd.to_numeric, downcast='float')
+        for col in float_cols:
+            df[col] = pd.to_numeric(df[col], downcast='float')
         print(f"[OK] {len(float_cols)} colunas decimais otimizadas")
     else:
         print("[INFO] Nenhuma coluna float64 encontrada")
     
     # Medir memória final
     print("\n--- ANÁLISE FINAL ---")
-    optimized_mem = df.memory_usage(deep=True).sum() / 1024**2
+    alteradas = [col for col, _ in converted_cols] + list(int_cols) + list(float_cols)
+    if alteradas:
+        mem_colunas[alteradas] = df[alteradas].memory_usage(deep=True, index=False)
+    optimized_mem = mem_colunas.sum() / 1024**2
     print(f"Uso de memória otimizado: {optimized_mem:.2f} MB")
     
     # Calcular economia
@@ -87,6 +95,52 @@ def otimizar_memoria_dataframe(df, nome="DataFrame"):
     return df
 
 
+# A partir de 1e6 o float32 é escrito em notação científica ('1e+06'),
+# enquanto o float64 continua '1000000.0'
+LIMITE_INTEIRO_FLOAT32 = 10 ** 6
+
+
+def reduzir_tipos(df, limite_categoria=0.5):
+    """
+    Versão silenciosa e sem perdas de ``otimizar_memoria_dataframe``,
+    para aplicar logo após a leitura de um CSV
+
+    Ao contrário do downcast padrão, o texto de cada valor não muda (IDs
+    gerados por hash e CSVs exportados continuam idênticos):
+    - inteiros: downcast para o menor tipo inteiro
+    - floats: float32 só quando todos os valores são inteiros abaixo de
+      ``LIMITE_INTEIRO_FLOAT32`` (valores monetários continuam float64)
+    - texto: 'category' quando únicos / total < ``limite_categoria``
+
+    Parâmetros:
+        df (DataFrame): DataFrame a ser reduzido (alterado no lugar)
+        limite_categoria (float): Proporção máxima de valores únicos
+
+    Retorna:
+        DataFrame: o mesmo DataFrame, com tipos reduzidos
+    """
+    if df.empty:
+        return df
+
+    for col in df.select_dtypes(include=['integer']).columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in df.select_dtypes(include=['float64']).columns:
+        valores = df[col].to_numpy()
+        validos = valores[~np.isnan(valores)]
+        if (
+            np.all(np.abs(validos) < LIMITE_INTEIRO_FLOAT32)
+            and np.array_equal(validos, np.trunc(validos))
+        ):
+            df[col] = valores.astype(np.float32)
+
+    for col in df.select_dtypes(include=['object']).columns:
+        if df[col].nunique() / len(df) < limite_categoria:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
 def remover_colunas_desnecessarias(df, colunas_para_remover=None):
     """
     Remove colunas desnecessárias do DataFrame
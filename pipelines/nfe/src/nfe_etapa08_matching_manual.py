@@ -5,10 +5,13 @@ Processa EANs que não tiveram match automático com ANVISA
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import gc
 import os
 from datetime import datetime
 
+from leitura_csv import ler_csv_arrow
+
 
 # ============================================================
 # CONFIGURAÇÕES
@@ -391,7 +394,9 @@ def processar_matching_manual(arquivo_entrada):
     
     # Carregar dados
     print(f"[INFO] Carregando arquivo: {arquivo_entrada}")
-    df = pd.read_csv(arquivo_entrada, sep=';', dtype={'codigo_ean': str})
+    df = ler_csv_arrow(
+        arquivo_entrada, {'codigo_ean': pa.string(), 'chave_codigo': pa.string()}
+    )
     print(f"[OK] {len(df):,} registros carregados\n")
     
     # Remover acentos das colunas
@@ -429,18 +434,16 @@ def processar_matching_manual(arquivo_entrada):
 # ============================================================
 
 if __name__ == "__main__":
-    import os
-    import glob
+    from paths import encontrar_mais_recente
     
     # Encontrar arquivo matched (etapa 7)
     arquivo = "data/processed/nfe_etapa07_matched.csv"
     
     if not os.path.exists(arquivo):
         # Fallback: procura com padrão antigo
-        arquivos = glob.glob("data/processed/nfe_matched_*.csv")
-        if not arquivos:
+        arquivo = encontrar_mais_recente("data/processed", "nfe_matched_", ".csv")
+        if arquivo is None:
             print("[ERRO] Nenhum arquivo nfe_matched encontrado!")
             exit(1)
-        arquivo = max(arquivos, key=os.path.getmtime)
     
     print(f"[INFO] Processando: {os.path.basename(arquivo)}\n")
@@ -235,7 +235,8 @@ def exportar_zip_fast(
         encoding='utf-8-sig',
         compression={
             'method': 'zip',
-            'archive_name': f"{nome_arquivo}.csv"
+            'archive_name': f"{nome_arquivo}.csv",
+            'compresslevel': 1,
         }
     )
     
@@ -9,10 +9,13 @@ Data: 2025-11-13
 import pandas as pd
 import numpy as np
 import json
-import re
 import os
 from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
 from tqdm.auto import tqdm
+from leitura_csv import ler_csv_arrow, ler_csv_zip_arrow
+from nfe_etapa06_otimizacao_memoria import reduzir_tipos
 from paths import SUPPORT_DIR
 
 # ============================================================
@@ -33,7 +36,7 @@ def carregar_recursos(
         caminho_parada: Caminho para termos de parada
         
     Returns:
-        Tupla (produtos_dict, termos_ignorados_set, termos_parada_set, produtos_regex)
+        Tupla (produtos_dict, termos_ignorados_set, termos_parada_set, indice_produtos)
     """
     print("\n" + "="*80)
     print("CARREGANDO RECURSOS PARA EXTRACAO DE NOMES")
@@ -68,20 +71,108 @@ def carregar_recursos(
         print(f"[ERRO] Falha ao carregar termos de parada: {e}")
         termos_parada_set = set()
     
-    # Compilar regex para produtos (otimização)
-    produtos_regex = None
-    if produtos_dict:
-        try:
-            produtos_pattern = r'\b(' + '|'.join(re.escape(k) for k in produtos_dict.keys()) + r')\b'
-            produtos_regex = re.compile(produtos_pattern, re.IGNORECASE)
-            print(f"[OK] Regex de produtos compilado")
-        except Exception as e:
-            print(f"[AVISO] Falha ao compilar regex: {e}")
-            produtos_regex = None
+    # Índice de produtos por prefixo (substitui a regex com milhares de alternativas).
+    # Montá-lo leva poucos ms, menos que ler e validar um cache em pickle
+    indice_produtos = montar_indice_produtos(produtos_dict) if produtos_dict else None
+    if indice_produtos:
+        print(f"[OK] Indice de produtos montado: {len(indice_produtos)} prefixos")
     
     print("="*80)
     
-    return produtos_dict, termos_ignorados_set, termos_parada_set, produtos_regex
+    return produtos_dict, termos_ignorados_set, termos_parada_set, indice_produtos
+
+
+def montar_indice_produtos(produtos_dict: dict) -> dict:
+    """
+    Agrupa as chaves de produtos pelos 2 primeiros caracteres.
+    
+    Cada grupo mantém a ordem do dicionário (e inclui as chaves de 1
+    caractere com a mesma inicial), reproduzindo a prioridade da antiga
+    alternância ``\\b(chave1|chave2|...)\\b``.
+    
+    Args:
+        produtos_dict: Dicionário de mapeamento direto
+        
+    Returns:
+        Dicionário prefixo -> tupla de chaves candidatas
+    """
+    por_prefixo = {}
+    curtas = {}
+    for ordem, chave in enumerate(produtos_dict):
+        if len(chave) == 1:
+            curtas.setdefault(chave, []).append((ordem, chave))
+        elif chave:
+            por_prefixo.setdefault(chave[:2], []).append((ordem, chave))
+    
+    indice = {
+        prefixo: tuple(chave for _, chave in sorted(lista + curtas.get(prefixo[0], [])))
+        for prefixo, lista in por_prefixo.items()
+    }
+    for letra, lista in curtas.items():
+        indice[letra] = tuple(chave for _, chave in lista)
+    return indice
+
+
+def mapear_produtos(chaves: pd.Series, produtos_dict: dict) -> np.ndarray:
+    """
+    Equivalente a ``chaves.map(produtos_dict)`` por indexação de array.
+    
+    As chaves viram códigos de um Categorical cujas categorias são as chaves
+    do dicionário; o código -1 (sem match) aponta para o NaN final do array.
+    
+    Args:
+        chaves: Série com as chaves encontradas (None quando não houve match)
+        produtos_dict: Dicionário de mapeamento direto
+        
+    Returns:
+        Array object com os nomes mapeados (NaN quando não houve match)
+    """
+    valores = np.empty(len(produtos_dict) + 1, dtype=object)
+    valores[:-1] = list(produtos_dict.values())
+    valores[-1] = np.nan
+    codigos = pd.Categorical(chaves, categories=list(produtos_dict)).codes
+    return valores[codigos]
+
+
+def _caractere_palavra(caractere: str) -> bool:
+    """Mesmo critério do ``\\w`` do módulo re (alfanumérico Unicode ou '_')."""
+    return caractere.isalnum() or caractere == "_"
+
+
+def buscar_produto(descricao: str, indice_produtos: dict):
+    """
+    Retorna a primeira chave de produto encontrada em ``descricao``.
+    
+    Equivale a ``re.search(r'\\b(chave1|chave2|...)\\b', descricao)``: vence a
+    posição mais à esquerda e, nela, a primeira chave (ordem do dicionário)
+    delimitada por fronteira de palavra. Só as chaves com o mesmo prefixo
+    são testadas em cada posição.
+    
+    Args:
+        descricao: Descrição já preprocessada (maiúsculas)
+        indice_produtos: Índice gerado por ``montar_indice_produtos``
+        
+    Returns:
+        Chave encontrada ou None
+    """
+    tamanho = len(descricao)
+    anterior_palavra = False
+    for posicao in range(tamanho):
+        atual_palavra = _caractere_palavra(descricao[posicao])
+        # Fronteira de palavra no início da chave
+        if atual_palavra != anterior_palavra:
+            candidatas = indice_produtos.get(descricao[posicao:posicao + 2])
+            if candidatas is None:
+                candidatas = indice_produtos.get(descricao[posicao], ())
+            for chave in candidatas:
+                if descricao.startswith(chave, posicao):
+                    fim = posicao + len(chave)
+                    depois_palavra = fim < tamanho and _caractere_palavra(descricao[fim])
+                    # Fronteira de palavra no fim da chave
+                    if depois_palavra != _caractere_palavra(chave[-1]):
+                        return chave
+        anterior_palavra = atual_palavra
+    return None
 
 
 def carregar_recursos_extracao(
@@ -93,14 +184,66 @@ def carregar_recursos_extracao(
     return carregar_recursos(caminho_produtos, caminho_ignorados, caminho_parada)
 
 
+# Recursos padrão (arquivos de SUPPORT_DIR), carregados uma vez por processo
+_RECURSOS_CACHE = None
+
+
+def get_recursos() -> tuple:
+    """
+    Retorna os recursos padrão de extração, lendo os JSONs só na primeira chamada.
+    
+    Returns:
+        Mesma tupla de ``carregar_recursos`` (compartilhada: não alterar)
+    """
+    global _RECURSOS_CACHE
+    if _RECURSOS_CACHE is None:
+        _RECURSOS_CACHE = carregar_recursos()
+    return _RECURSOS_CACHE
+
+
 # ============================================================
 # FUNÇÕES DE PRÉ-PROCESSAMENTO
 # ============================================================
 
+# Regex para remover palavras inteiras como 'ID' ou 'ITEM'
+REMOVER_PALAVRAS_PATTERN = r'\b(ID|ITEM)\b'
+
+# Espaços do \s do RE2 (Arrow). Em texto ASCII só \v e \x1c-\x1f ficam de fora:
+# descrições com esses caracteres (ou não-ASCII) seguem pelo re do Python
+ESPACOS_RE2 = " \t\n\f\r"
+FORA_DO_RE2_PATTERN = r"[\x0b\x1c-\x1f]"
+
+
+def _preprocessar_pandas(series: pd.Series) -> pd.Series:
+    """Cadeia original de ``.str`` (re do Python, Unicode completo)."""
+    return (
+        series.astype(str)
+        .str.strip()
+        .str.upper()  # Padroniza para maiúsculas
+        .str.replace(REMOVER_PALAVRAS_PATTERN, '', regex=True)
+        .str.removeprefix("C 1 ")  # Remove prefixo comum
+        .str.replace(r'\s+', ' ', regex=True)  # Consolida espaços
+        .str.strip()
+    )
+
+
+def _preprocessar_arrow(textos: pa.Array) -> pa.Array:
+    """Mesma cadeia de ``_preprocessar_pandas`` em kernels Arrow (textos ASCII)."""
+    textos = pc.utf8_upper(pc.utf8_trim(textos, characters=ESPACOS_RE2))
+    textos = pc.replace_substring_regex(textos, pattern=REMOVER_PALAVRAS_PATTERN, replacement='')
+    textos = pc.if_else(pc.starts_with(textos, "C 1 "), pc.utf8_slice_codeunits(textos, 4), textos)
+    textos = pc.replace_substring_regex(textos, pattern=r'\s+', replacement=' ')
+    return pc.utf8_trim(textos, characters=' ')
+
+
 def preprocessar_descricoes(series: pd.Series) -> pd.Series:
     """
     Limpa e padroniza descrições usando operações vetorizadas.
     
+    Cada descrição distinta é processada uma única vez. As ASCII passam por
+    kernels Arrow (C++); as demais usam o re do Python, cujo ``\\b``/``\\s``
+    são Unicode, mantendo o resultado idêntico para qualquer texto.
+    
     Args:
         series: Series com descrições brutas
         
@@ -109,18 +252,28 @@ def preprocessar_descricoes(series: pd.Series) -> pd.Series:
     """
     print("\n[INFO] Preprocessando descricoes...")
     
-    # Regex para remover palavras inteiras como 'ID' ou 'ITEM'
-    remover_palavras_pattern = r'\b(ID|ITEM)\b'
-    
-    processed_series = (
-        series.astype(str)
-        .str.strip()
-        .str.upper()  # Padroniza para maiúsculas
-        .str.replace(remover_palavras_pattern, '', regex=True)
-        .str.removeprefix("C 1 ")  # Remove prefixo comum
-        .str.replace(r'\s+', ' ', regex=True)  # Consolida espaços
-        .str.strip()
-    )
+    # Fatoriza antes de converter para texto: só os valores distintos viram str
+    # (em coluna category, o factorize reaproveita os códigos)
+    codigos, unicas = pd.factorize(series)
+    unicas = pd.Index(np.asarray(unicas, dtype=object)).astype(str)
+    nulos = codigos == -1
+    if nulos.any():
+        # None e NaN viram textos diferentes ('None'/'nan'), como no astype(str)
+        codigos_nulos, unicas_nulas = pd.factorize(series[nulos].astype(str))
+        codigos[nulos] = codigos_nulos + len(unicas)
+        unicas = unicas.append(unicas_nulas)
+    textos = pa.array(unicas.to_numpy(dtype=object), type=pa.string())
+    via_arrow = pc.and_(
+        pc.string_is_ascii(textos),
+        pc.invert(pc.match_substring_regex(textos, pattern=FORA_DO_RE2_PATTERN)),
+    ).to_numpy(zero_copy_only=False)
+    
+    limpas = np.empty(len(unicas), dtype=object)
+    limpas[via_arrow] = _preprocessar_arrow(textos.filter(via_arrow)).to_numpy(zero_copy_only=False)
+    if not via_arrow.all():
+        limpas[~via_arrow] = _preprocessar_pandas(pd.Series(unicas[~via_arrow])).to_numpy(dtype=object)
+    
+    processed_series = pd.Series(limpas[codigos], index=series.index, dtype=object)
     
     print(f"[OK] {len(processed_series)} descricoes preprocessadas")
     
@@ -131,14 +284,45 @@ def preprocessar_descricoes(series: pd.Series) -> pd.Series:
 # FUNÇÕES DE EXTRAÇÃO
 # ============================================================
 
-# Regex para casos especiais (letras isoladas com símbolos)
-LETRA_ESPECIAL_REGEX = re.compile(r"^[E-FKT](?:[/\\;,.:]*)$", re.IGNORECASE)
+# Casos especiais: letra isolada seguida só de símbolos (ex: 'F;'), o mesmo
+# que ^[E-FKT][/\\;,.:]*$ com IGNORECASE (que também aceita o sinal Kelvin)
+LETRAS_ESPECIAIS = frozenset("EFKTefkt\u212a")
+SIMBOLOS_LETRA_ESPECIAL = "/\\;,.:"
+# Tabela que remove dígitos ASCII: ``translate`` roda em C, sem laço por caractere
+TABELA_DIGITOS = str.maketrans('', '', '0123456789')
+
+# Classes de palavra usadas pela lógica de extração
+PALAVRA_NORMAL = 0
+PALAVRA_PARADA = 1  # termo de parada ou contém números
+PALAVRA_LETRA_ESPECIAL = 2  # ex: 'F;'
+
+# Descrições por bloco entre registros de progresso da lógica detalhada
+TAMANHO_BLOCO_PROGRESSO = 200_000
+
+
+def _contem_digito(palavra: str) -> bool:
+    """Equivale a ``any(char.isdigit() for char in palavra)``."""
+    if palavra.isascii():
+        return len(palavra.translate(TABELA_DIGITOS)) != len(palavra)
+    # Fora do ASCII, isdigit também aceita dígitos Unicode (ex: '²')
+    return any(char.isdigit() for char in palavra)
+
+
+def classificar_palavra(palavra: str, termos_parada_set: set) -> int:
+    """Classifica uma palavra (sem espaços, vinda de ``split``) para a lógica de extração (PALAVRA_*)."""
+    if palavra in termos_parada_set or _contem_digito(palavra):
+        return PALAVRA_PARADA
+    if palavra and palavra[0] in LETRAS_ESPECIAIS and not palavra[1:].strip(SIMBOLOS_LETRA_ESPECIAL):
+        return PALAVRA_LETRA_ESPECIAL
+    return PALAVRA_NORMAL
+
 
 def extrair_nome_logica(
     descricao: str,
     produtos_dict: dict,
     termos_ignorados_set: set,
-    termos_parada_set: set
+    termos_parada_set: set,
+    cache_palavras: dict = None
 ) -> str:
     """
     Extrai nome do medicamento usando lógica de regras.
@@ -148,6 +332,8 @@ def extrair_nome_logica(
         produtos_dict: Dicionário de mapeamento direto
         termos_ignorados_set: Termos a ignorar no início
         termos_parada_set: Termos que indicam fim do nome
+        cache_palavras: Classificação já calculada por palavra (compartilhar
+            entre chamadas com o mesmo ``termos_parada_set``)
         
     Returns:
         Nome extraído do produto
@@ -162,14 +348,22 @@ def extrair_nome_logica(
     while palavras and palavras[0] in termos_ignorados_set:
         palavras.pop(0)
     
+    if cache_palavras is None:
+        cache_palavras = {}
+    
     medicamento = []
     for palavra in palavras:
+        # Cada palavra distinta é classificada uma única vez
+        tipo = cache_palavras.get(palavra)
+        if tipo is None:
+            tipo = cache_palavras[palavra] = classificar_palavra(palavra, termos_parada_set)
+        
         # Condição de parada: termo de parada ou contém números
-        if palavra in termos_parada_set or any(char.isdigit() for char in palavra):
+        if tipo == PALAVRA_PARADA:
             break
         
         # Tratamento de caso especial (ex: 'F;')
-        if LETRA_ESPECIAL_REGEX.match(palavra):
+        if tipo == PALAVRA_LETRA_ESPECIAL:
             medicamento.append(palavra[0])
             break
         
@@ -178,6 +372,28 @@ def extrair_nome_logica(
     return ' '.join(medicamento)
 
 
+def _aplicar_em_blocos(descricoes: pd.Series, funcao, tamanho_bloco: int = TAMANHO_BLOCO_PROGRESSO) -> pd.Series:
+    """
+    Aplica ``funcao`` a cada descrição, registrando o progresso entre blocos
+    (sem o custo de um callback de progresso por linha).
+    
+    Args:
+        descricoes: Descrições a processar
+        funcao: Função aplicada a cada descrição
+        tamanho_bloco: Descrições por bloco de progresso
+        
+    Returns:
+        Series com os resultados, no mesmo índice
+    """
+    valores = descricoes.to_numpy(dtype=object)
+    total = len(valores)
+    resultados = []
+    for inicio in range(0, total, tamanho_bloco):
+        resultados.extend([funcao(descricao) for descricao in valores[inicio:inicio + tamanho_bloco]])
+        print(f"[INFO] Extraindo nomes: {len(resultados):,}/{total:,}")
+    return pd.Series(resultados, index=descricoes.index, dtype=object)
+
+
 # ============================================================
 # PIPELINE DE EXTRAÇÃO
 # ============================================================
@@ -188,7 +404,8 @@ def executar_extracao_nomes(
     produtos_dict: dict = None,
     termos_ignorados_set: set = None,
     termos_parada_set: set = None,
-    produtos_regex = None
+    indice_produtos: dict = None,
+    verbose: bool = False
 ) -> pd.DataFrame:
     """
     Executa pipeline completo de extração de nomes.
@@ -199,7 +416,9 @@ def executar_extracao_nomes(
         produtos_dict: Dicionário de mapeamento (se None, carrega)
         termos_ignorados_set: Set de termos ignorados (se None, carrega)
         termos_parada_set: Set de termos de parada (se None, carrega)
-        produtos_regex: Regex compilado (se None, carrega)
+        indice_produtos: Índice de prefixos de produtos (se None, carrega)
+        verbose: Mostra barra tqdm por linha na lógica detalhada (mais lento);
+            por padrão o progresso é registrado a cada bloco
         
     Returns:
         DataFrame com coluna NOME_PRODUTO adicionada
@@ -217,8 +436,8 @@ def executar_extracao_nomes(
     
     # Carregar recursos se não fornecidos
     if produtos_dict is None:
-        recursos = carregar_recursos_extracao()
-        produtos_dict, termos_ignorados_set, termos_parada_set, produtos_regex = recursos
+        recursos = get_recursos()
+        produtos_dict, termos_ignorados_set, termos_parada_set, indice_produtos = recursos
     
     # Etapa 1: Pré-processamento vetorizado
     print("\n" + "="*80)
@@ -226,19 +445,28 @@ def executar_extracao_nomes(
     print("="*80)
     df['descricao_limpa'] = preprocessar_descricoes(df[coluna_descricao])
     
+    # Busca e lógica rodam uma vez por descrição distinta; o resultado volta
+    # para as linhas pelos códigos do factorize
+    codigos, descricoes_unicas = pd.factorize(df['descricao_limpa'])
+    descricoes_unicas = np.asarray(descricoes_unicas, dtype=object)
+    print(f"[INFO] {len(descricoes_unicas):,} descricoes distintas em {len(df):,} linhas")
+    
     # Etapa 2.1: Match rápido vetorizado com dicionário
     print("\n" + "="*80)
     print("ETAPA 2.1: MATCH RAPIDO (VETORIZADO)")
     print("="*80)
     
-    df['NOME_PRODUTO'] = pd.NA
+    nomes_unicos = np.full(len(descricoes_unicas), np.nan, dtype=object)
     matched_count = 0
     
-    if produtos_regex:
-        print("[INFO] Executando busca vetorizada com regex...")
-        matches_rapidos = df['descricao_limpa'].str.extract(produtos_regex, expand=False)
-        df['NOME_PRODUTO'] = matches_rapidos.map(produtos_dict)
-        matched_count = df['NOME_PRODUTO'].notna().sum()
+    if indice_produtos:
+        print("[INFO] Executando busca com indice de produtos...")
+        matches_rapidos = pd.Series(
+            [buscar_produto(descricao, indice_produtos) for descricao in descricoes_unicas],
+            dtype=object,
+        )
+        nomes_unicos = mapear_produtos(matches_rapidos, produtos_dict)
+        matched_count = pd.notna(nomes_unicos)[codigos].sum()
         print(f"[OK] {matched_count:,} linhas resolvidas na primeira passagem")
     else:
         print("[AVISO] Dicionario de produtos vazio, pulando primeira passagem")
@@ -248,30 +476,41 @@ def executar_extracao_nomes(
     print("ETAPA 2.2: LOGICA DETALHADA (COM PROGRESSO)")
     print("="*80)
     
-    mask_nao_resolvido = df['NOME_PRODUTO'].isna()
-    remaining_count = mask_nao_resolvido.sum()
+    mask_nao_resolvido = pd.isna(nomes_unicos)
+    remaining_count = mask_nao_resolvido[codigos].sum()
     
     if remaining_count > 0:
-        print(f"[INFO] Aplicando logica em {remaining_count:,} linhas restantes...")
+        pendentes = pd.Series(descricoes_unicas[mask_nao_resolvido], dtype=object)
+        print(
+            f"[INFO] Aplicando logica em {remaining_count:,} linhas restantes "
+            f"({len(pendentes):,} descricoes distintas)..."
+        )
         
-        # Inicializa tqdm para Pandas
-        tqdm.pandas(desc="Extraindo Nomes")
+        cache_palavras = {}
         
-        # Aplica função com progress bar apenas no subconjunto
-        resultados_lentos = df.loc[mask_nao_resolvido, 'descricao_limpa'].progress_apply(
-            lambda x: extrair_nome_logica(
-                x, 
+        def extrair(descricao):
+            return extrair_nome_logica(
+                descricao, 
                 produtos_dict, 
                 termos_ignorados_set, 
-                termos_parada_set
+                termos_parada_set,
+                cache_palavras
             )
-        )
         
-        df.loc[mask_nao_resolvido, 'NOME_PRODUTO'] = resultados_lentos
+        if verbose:
+            # Barra de progresso por linha (callback do tqdm a cada descrição)
+            tqdm.pandas(desc="Extraindo Nomes")
+            resultados_lentos = pendentes.progress_apply(extrair)
+        else:
+            resultados_lentos = _aplicar_em_blocos(pendentes, extrair)
+        
+        nomes_unicos[mask_nao_resolvido] = resultados_lentos.to_numpy(dtype=object)
         print(f"[OK] {remaining_count:,} linhas processadas com logica detalhada")
     else:
         print("[OK] Todas as linhas resolvidas na primeira passagem")
     
+    df['NOME_PRODUTO'] = pd.Series(nomes_unicos[codigos], index=df.index, dtype=object)
+    
     # Etapa 3: Limpeza final
     print("\n" + "="*80)
     print("ETAPA 3: LIMPEZA FINAL")
@@ -352,7 +591,14 @@ def processar_extracao_nomes(
     
     # Carregar dados
     print(f"\n[INFO] Carregando dados...")
-    df = pd.read_csv(arquivo_entrada, sep=';', encoding='utf-8-sig')
+    # Parser Arrow (multithread); a chave da NFe de 44 dígitos é lida como texto
+    tipos_leitura = {'chave_codigo': pa.string()}
+    if arquivo_entrada.lower().endswith('.zip'):
+        df = ler_csv_zip_arrow(arquivo_entrada, tipos_leitura)
+    else:
+        df = ler_csv_arrow(arquivo_entrada, tipos_leitura)
+    # Inteiros menores e texto repetitivo como category (sem mudar o CSV de saída)
+    df = reduzir_tipos(df)
     print(f"   [OK] Carregado com sucesso!")
     print(f"   Shape: {df.shape}")
     
@@ -360,19 +606,18 @@ def processar_extracao_nomes(
     df = executar_extracao_nomes(df)
     
     # Salvar resultado
-    nome_saida = f"df_etapa10_trabalhando_nomes.zip"
+    nome_saida = "df_etapa10_trabalhando_nomes.parquet"
     caminho_saida = os.path.join(diretorio_saida, nome_saida)
     
     print(f"\n[INFO] Salvando resultado...")
-    df.to_csv(
+    # Parquet colunar com zstd: escrita sem formatar texto nem DEFLATE, e a
+    # Etapa 11 lê sem parse de CSV
+    df.to_parquet(
         caminho_saida,
-        sep=';',
-        index=False,
-        encoding='utf-8-sig',
-        compression={
-            'method': 'zip',
-            'archive_name': f"df_trabalhando_nomes.csv"
-        }
+        engine='pyarrow',
+        compression='zstd',
+        compression_level=3,
+        index=False
     )
     
     tamanho_saida = os.path.getsize(caminho_saida) / (1024 * 1024)
@@ -11,9 +11,27 @@ import numpy as np
 import json
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
+from itertools import repeat
+import pyarrow as pa
+import pyarrow.compute as pc
 from tqdm.auto import tqdm
 from pathlib import Path
+from leitura_csv import ler_parquet_como_csv
+
+# Processos usados nas ETAPAS 1-3 (1 = sem paralelismo, padrão; 0 = um por CPU).
+# Opcional, como o ETAPA22_PROCESSOS_HASH: cada lote leva a função e os conjuntos
+# de referência por pickle aos processos, o que pode anular o ganho
+PROCESSOS_REFINAMENTO = int(os.environ.get("ETAPA11_PROCESSOS", "1") or 0)
+# Abaixo disso o custo de iniciar os processos supera o ganho
+MIN_NOMES_PARALELO = 50_000
+# Os caracteres de ``\s`` no ``re`` (str.isspace); o ``\s`` do RE2 só cobre ASCII sem \v
+ESPACOS_ARROW = (
+    r"[\x{9}-\x{d}\x{1c}-\x{20}\x{85}\x{a0}\x{1680}\x{2000}-\x{200a}"
+    r"\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]+"
+)
 
 # ============================================================
 # CARREGAMENTO DE RECURSOS
@@ -136,18 +154,24 @@ def carregar_recursos_refinamento(
             abrev_json = json.load(f)
         recursos['abbreviation_mapping'] = abrev_json.get("abbreviation_mapping", {})
         
-        # Compila regex para performance
+        # Compila regex para performance. Não vale cache em disco: o pickle de um
+        # re.Pattern guarda só o texto e recompila ao carregar (~5 ms aqui)
         if recursos['abbreviation_mapping']:
             pattern = r'\b(' + '|'.join(map(re.escape, recursos['abbreviation_mapping'].keys())) + r')\b'
             recursos['abrev_pattern'] = re.compile(pattern, re.IGNORECASE)
+            # O mesmo padrão no RE2 do Arrow só separa os candidatos se as chaves forem ASCII
+            chaves_ascii = all(chave.isascii() for chave in recursos['abbreviation_mapping'])
+            recursos['abrev_pattern_arrow'] = pattern if chaves_ascii else None
         else:
             recursos['abrev_pattern'] = None
+            recursos['abrev_pattern_arrow'] = None
         
         print(f"[OK] Abreviacoes: {len(recursos['abbreviation_mapping'])} mapeamentos")
     except Exception as e:
         print(f"[ERRO] Falha ao carregar abreviações: {e}")
         recursos['abbreviation_mapping'] = {}
         recursos['abrev_pattern'] = None
+        recursos['abrev_pattern_arrow'] = None
     
     # 4. Regras químicas
     try:
@@ -163,10 +187,12 @@ def carregar_recursos_refinamento(
     try:
         with open(caminho_regras_negocio, "r", encoding="utf-8") as f:
             recursos['regras_negocio_json'] = json.load(f)
-        print(f"[OK] Regras de negocio: carregadas")
+        recursos['regras_negocio_compiladas'] = compilar_regras_negocio(recursos['regras_negocio_json'])
+        print(f"[OK] Regras de negocio: {len(recursos['regras_negocio_compiladas'])} regras de substituicao")
     except Exception as e:
         print(f"[ERRO] Falha ao carregar regras de negócio: {e}")
         recursos['regras_negocio_json'] = {}
+        recursos['regras_negocio_compiladas'] = []
     
     # 6. Dicionário fuzzy
     try:
@@ -193,8 +219,17 @@ def verificar_matches(df: pd.DataFrame, master_set: set, column: str, step_name:
     Returns:
         Dicionário com estatísticas
     """
-    match_count = df[column].isin(master_set).sum()
-    total_rows = len(df)
+    return relatar_matches(df[column].isin(master_set).sum(), len(df), column, step_name)
+
+
+def relatar_matches(match_count: int, total_rows: int, column: str, step_name: str = "") -> dict:
+    """
+    Imprime e devolve as estatísticas de matching a partir de uma contagem
+    já calculada (ex. somada sobre os nomes distintos).
+    
+    Returns:
+        Dicionário com estatísticas
+    """
     match_percentage = (match_count / total_rows) * 100 if total_rows > 0 else 0
     
     stats = {
@@ -223,16 +258,16 @@ def limpar_letras_isoladas(nome_produto: str, letras_a_verificar: set, termos_pe
     if not isinstance(nome_produto, str):
         return ""
     
-    palavras = nome_produto.split()
     resultado = []
+    manter = resultado.append
+    anterior = None
     
-    for i, palavra_atual in enumerate(palavras):
-        if palavra_atual in letras_a_verificar:
-            # Mantém letra se precedida de termo permitido
-            if i > 0 and palavras[i - 1] in termos_permitidos:
-                resultado.append(palavra_atual)
-        else:
-            resultado.append(palavra_atual)
+    for palavra_atual in nome_produto.split():
+        # Mantém letra se precedida de termo permitido (a palavra anterior
+        # conta mesmo quando foi removida)
+        if palavra_atual not in letras_a_verificar or anterior in termos_permitidos:
+            manter(palavra_atual)
+        anterior = palavra_atual
     
     return ' '.join(resultado)
 
@@ -305,6 +340,52 @@ def aplicar_regras_override_descricao(row: pd.Series, regras_negocio_json: dict)
     return current_limpo
 
 
+def aplicar_regras_override_vetorizado(
+    descricoes: pd.Series, nomes_atuais: pd.Series, regras_negocio_json: dict
+) -> pd.Series:
+    """
+    Versão vetorizada de ``aplicar_regras_override_descricao`` para uma Series.
+    
+    Cada padrão distinto é procurado uma única vez (kernel Arrow) nas
+    descrições distintas em maiúsculas; cada regra vira um AND das presenças
+    dos seus padrões e vale a primeira regra satisfeita, como no laço original.
+    """
+    regras_override = regras_negocio_json.get("regras_override_descricao", [])
+    resultado = nomes_atuais.to_numpy(dtype=object, copy=True)
+    if not regras_override or descricoes.empty:
+        return pd.Series(resultado, index=nomes_atuais.index, dtype=object)
+    
+    # str() e upper() do Python só nos distintos (NaN -> 'NAN', None -> 'NONE')
+    codigos, unicas = pd.factorize(descricoes)
+    unicas = pd.Index(np.asarray(unicas, dtype=object)).astype(str)
+    nulos = codigos == -1
+    if nulos.any():
+        # None e NaN viram textos diferentes, como no str() por linha
+        codigos_nulos, unicas_nulas = pd.factorize(descricoes[nulos].astype(str))
+        codigos[nulos] = codigos_nulos + len(unicas)
+        unicas = unicas.append(unicas_nulas)
+    textos = pa.array([descricao.upper() for descricao in unicas], type=pa.string())
+    
+    presenca = {}
+    regra_unica = np.full(len(unicas), -1, dtype=np.int32)
+    pendente = np.ones(len(unicas), dtype=bool)
+    for indice, regra in enumerate(regras_override):
+        satisfeita = pendente.copy()
+        for padrao in regra["padroes"]:
+            padrao = padrao.upper()
+            if padrao not in presenca:
+                presenca[padrao] = pc.match_substring(textos, padrao).to_numpy(zero_copy_only=False)
+            satisfeita &= presenca[padrao]
+        regra_unica[satisfeita] = indice
+        pendente &= ~satisfeita
+    
+    regra_linha = regra_unica[codigos]
+    com_regra = regra_linha >= 0
+    substituicoes = np.array([regra["substituicao"] for regra in regras_override], dtype=object)
+    resultado[com_regra] = substituicoes[regra_linha[com_regra]]
+    return pd.Series(resultado, index=nomes_atuais.index, dtype=object)
+
+
 def aplicar_regras_negocio(nome_produto: str, regras_negocio_json: dict) -> str:
     """
     Aplica conjunto de regras de negócio em ordem específica.
@@ -337,10 +418,178 @@ def aplicar_regras_negocio(nome_produto: str, regras_negocio_json: dict) -> str:
     return nome_produto
 
 
+def compilar_regras_negocio(regras_negocio_json: dict) -> list:
+    """
+    Converte as três famílias de regras de substituição, na ordem em que
+    ``aplicar_regras_negocio`` as avalia, numa lista de tuplas
+    (termos exigidos, termos proibidos, substituição).
+    
+    Feito uma vez no carregamento: as chaves já saem separadas por vírgula.
+    """
+    regras = [
+        (tuple(chaves_str.split(',')), (), substituicao)
+        for chaves_str, substituicao in regras_negocio_json.get("regras_substituicao_multi_chave", {}).items()
+    ]
+    regras += [
+        (tuple(regra.get("contem", [])), tuple(regra.get("nao_contem", [])), regra["substituir_por"])
+        for regra in regras_negocio_json.get("regras_condicionais_complexas", [])
+    ]
+    regras += [
+        ((chave,), (), substituicao)
+        for chave, substituicao in regras_negocio_json.get("regras_substituicao_chave_unica", {}).items()
+    ]
+    return regras
+
+
+def aplicar_regras_negocio_vetorizado(nomes: pd.Series, regras: list) -> pd.Series:
+    """
+    Versão vetorizada de ``aplicar_regras_negocio`` para uma Series, sobre as
+    regras de ``compilar_regras_negocio``.
+    
+    Cada termo distinto é procurado uma única vez (kernel Arrow) nos nomes
+    distintos e vale a primeira regra satisfeita, como no laço original.
+    Valores que não são texto viram ''.
+    """
+    valores = nomes.to_numpy(dtype=object)
+    eh_texto = np.fromiter((isinstance(valor, str) for valor in valores), dtype=bool, count=len(valores))
+    resultado = np.full(len(valores), "", dtype=object)
+    resultado[eh_texto] = valores[eh_texto]
+    if not regras or not eh_texto.any():
+        return pd.Series(resultado, index=nomes.index, dtype=object)
+    
+    codigos, unicos = pd.factorize(valores[eh_texto])
+    textos = pa.array(np.asarray(unicos, dtype=object), type=pa.string())
+    
+    presenca = {}
+    def contem(termo):
+        if termo not in presenca:
+            presenca[termo] = pc.match_substring(textos, termo).to_numpy(zero_copy_only=False)
+        return presenca[termo]
+    
+    regra_unica = np.full(len(unicos), -1, dtype=np.int32)
+    pendente = np.ones(len(unicos), dtype=bool)
+    for indice, (exigidos, proibidos, _) in enumerate(regras):
+        satisfeita = pendente.copy()
+        for termo in exigidos:
+            satisfeita &= contem(termo)
+        for termo in proibidos:
+            satisfeita &= ~contem(termo)
+        regra_unica[satisfeita] = indice
+        pendente &= ~satisfeita
+    
+    regra_linha = regra_unica[codigos]
+    com_regra = regra_linha >= 0
+    substituicoes = np.array([substituicao for _, _, substituicao in regras], dtype=object)
+    textos_linha = resultado[eh_texto]
+    textos_linha[com_regra] = substituicoes[regra_linha[com_regra]]
+    resultado[eh_texto] = textos_linha
+    return pd.Series(resultado, index=nomes.index, dtype=object)
+
+
 # ============================================================
 # PIPELINE DE REFINAMENTO
 # ============================================================
 
+def _aplicar_lote(funcao, valores: list) -> list:
+    """Aplica ``funcao`` a um lote de nomes (função de módulo para ir a processos filhos)."""
+    return [funcao(valor) for valor in valores]
+
+
+def aplicar_em_distintos(serie: pd.Series, funcao, desc: str = None) -> pd.Series:
+    """
+    Aplica ``funcao`` uma vez por valor distinto de ``serie`` e devolve o
+    resultado para todas as linhas (os nomes se repetem muito nas NFe).
+    
+    Com muitos nomes distintos e ``ETAPA11_PROCESSOS`` diferente de 1, os lotes
+    são repartidos entre processos (``funcao`` precisa ser serializável: função de módulo ou ``partial``).
+    Nulos ficam fora do factorize e passam pela função linha a linha, para
+    que None e NaN continuem distintos quando a função os devolve intactos.
+    """
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(np.asarray(unicos, dtype=object), dtype=object)
+    processos = PROCESSOS_REFINAMENTO or (os.cpu_count() or 1)
+    if processos > 1 and len(unicos) >= MIN_NOMES_PARALELO:
+        valores = unicos.tolist()
+        tamanho_lote = -(-len(valores) // (processos * 4))
+        lotes = [valores[i:i + tamanho_lote] for i in range(0, len(valores), tamanho_lote)]
+        print(f"[INFO] {len(valores):,} nomes distintos em {len(lotes)} lotes, {processos} processos")
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            transformados = pd.Series(
+                [valor for lote in executor.map(_aplicar_lote, repeat(funcao), lotes) for valor in lote],
+                dtype=object,
+            )
+    elif desc:
+        tqdm.pandas(desc=desc)
+        transformados = unicos.progress_apply(funcao)
+    else:
+        transformados = unicos.apply(funcao)
+    
+    resultado = np.empty(len(serie), dtype=object)
+    nulos = codigos == -1
+    resultado[~nulos] = transformados.to_numpy(dtype=object)[codigos[~nulos]]
+    if nulos.any():
+        resultado[nulos] = [funcao(valor) for valor in serie.to_numpy(dtype=object)[nulos]]
+    return pd.Series(resultado, index=serie.index, dtype=object)
+
+
+def expandir_abreviacoes_vetorizado(
+    nomes: pd.Series, abrev_pattern, abbreviation_mapping: dict,
+    abrev_pattern_arrow: str = None, desc: str = None
+) -> pd.Series:
+    """
+    Versão de ``expandir_abreviacoes`` para uma Series.
+    
+    O custo está na busca do regex, não na substituição: o RE2 do Arrow
+    procura o mesmo padrão em todos os nomes de uma vez e só os que têm
+    alguma abreviação passam pelo ``re``. Em texto ASCII o ``\\b`` e o
+    IGNORECASE dos dois motores coincidem; nomes com outros caracteres
+    seguem sempre para o ``re``.
+    """
+    expandir = partial(
+        expandir_abreviacoes, abrev_pattern=abrev_pattern, abbreviation_mapping=abbreviation_mapping
+    )
+    valores = nomes.to_numpy(dtype=object)
+    candidatos = np.fromiter((isinstance(valor, str) for valor in valores), dtype=bool, count=len(valores))
+    if abrev_pattern_arrow and candidatos.any():
+        textos = pa.array(valores[candidatos], type=pa.string())
+        com_abreviacao = pc.or_(
+            pc.invert(pc.string_is_ascii(textos)),
+            pc.match_substring_regex(textos, abrev_pattern_arrow, ignore_case=True),
+        )
+        candidatos[candidatos] = com_abreviacao.to_numpy(zero_copy_only=False)
+    
+    resultado = valores.copy()
+    if candidatos.any():
+        resultado[candidatos] = aplicar_em_distintos(
+            pd.Series(valores[candidatos], dtype=object), expandir, desc=desc
+        ).to_numpy(dtype=object)
+    return pd.Series(resultado, index=nomes.index, dtype=object)
+
+
+def limpar_nomes_final(nomes: pd.Series) -> pd.Series:
+    """
+    Limpeza final: espaços repetidos viram um só, ';', '+' e espaços saem
+    das pontas e o nome é cortado em 100 caracteres.
+    
+    Só os textos distintos passam pelos kernels do Arrow, sem converter a
+    coluna, que continua ``object``. Como no ``.str`` do pandas, nulos ficam
+    como estão e outros tipos viram NaN.
+    """
+    valores = nomes.to_numpy(dtype=object)
+    eh_texto = np.fromiter((isinstance(valor, str) for valor in valores), dtype=bool, count=len(valores))
+    resultado = np.empty(len(valores), dtype=object)
+    if eh_texto.any():
+        codigos, unicos = pd.factorize(valores[eh_texto])
+        textos = pa.array(np.asarray(unicos, dtype=object), type=pa.string())
+        textos = pc.replace_substring_regex(textos, ESPACOS_ARROW, ' ')
+        textos = pc.utf8_trim(textos, ';+ ')
+        resultado[eh_texto] = pc.utf8_slice_codeunits(textos, 0, 100).to_numpy(zero_copy_only=False)[codigos]
+    if not eh_texto.all():
+        outros = valores[~eh_texto]
+        resultado[~eh_texto] = np.where(pd.isna(outros), outros, np.nan)
+    return pd.Series(resultado, index=nomes.index, dtype=object)
+
+
 def executar_refinamento_nomes(df: pd.DataFrame, recursos: dict) -> pd.DataFrame:
     """
     Executa pipeline completo de refinamento em cascata.
@@ -357,11 +606,10 @@ def executar_refinamento_nomes(df: pd.DataFrame, recursos: dict) -> pd.DataFrame
     df = df[df['NOME_PRODUTO'] != 'DELETAR'].copy()
     df['NOME_PRODUTO_LIMPO'] = df['NOME_PRODUTO']
     
-    stats = verificar_matches(
-        df, recursos['set_produtos_master'], 
-        'NOME_PRODUTO_LIMPO', 
-        "Baseline Inicial"
-    )
+    # Máscara de correspondência mantida entre as etapas: cada etapa só altera
+    # linhas não correspondidas, então só elas precisam ser verificadas de novo
+    correspondido = df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master']).to_numpy()
+    stats = relatar_matches(int(correspondido.sum()), len(df), 'NOME_PRODUTO_LIMPO', "Baseline Inicial")
     stats_list.append(stats)
     
     # ETAPA 0.5: Override por descrição
@@ -369,118 +617,129 @@ def executar_refinamento_nomes(df: pd.DataFrame, recursos: dict) -> pd.DataFrame
     print("ETAPA 0.5: OVERRIDE POR DESCRICAO")
     print("="*80)
     
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
-    print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
-    
-    tqdm.pandas(desc="Override Desc.")
-    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-        df.loc[mask_nao_correspondido].progress_apply(
-            lambda row: aplicar_regras_override_descricao(row, recursos['regras_negocio_json']), 
-            axis=1
-        )
-    
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Override")
-    stats_list.append(stats)
-    
-    # ETAPA 1: Limpeza de letras isoladas
-    print("\n" + "="*80)
-    print("ETAPA 1: LIMPEZA DE LETRAS ISOLADAS")
-    print("="*80)
-    
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
-    print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
-    
-    tqdm.pandas(desc="Limpando Letras")
-    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'].progress_apply(
-            lambda x: limpar_letras_isoladas(x, recursos['letras_a_verificar'], recursos['termos_permitidos'])
-        )
-    
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Limpeza Letras")
-    stats_list.append(stats)
-    
-    # ETAPA 2: Expansão de abreviações
-    print("\n" + "="*80)
-    print("ETAPA 2: EXPANSAO DE ABREVIACOES")
-    print("="*80)
-    
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
-    print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
-    
-    if recursos['abrev_pattern']:
-        tqdm.pandas(desc="Expandindo Abreviac.")
-        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-            df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'].progress_apply(
-                lambda x: expandir_abreviacoes(x, recursos['abrev_pattern'], recursos['abbreviation_mapping'])
-            )
-    else:
-        print("[AVISO] Sem abreviacoes para expandir")
-    
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Abreviacoes")
-    stats_list.append(stats)
-    
-    # ETAPA 3: Reestruturação química
-    print("\n" + "="*80)
-    print("ETAPA 3: REESTRUTURACAO QUIMICA")
-    print("="*80)
-    
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
+    mask_nao_correspondido = ~correspondido
     print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
     
-    tqdm.pandas(desc="Reestruturando")
-    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'].progress_apply(
-            lambda x: reestruturar_nome_quimico(x, recursos['termos_quimicos_set'])
-        )
+    nomes_override = aplicar_regras_override_vetorizado(
+        df.loc[mask_nao_correspondido, 'descricao_produto'],
+        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'],
+        recursos['regras_negocio_json']
+    )
+    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = nomes_override
+    correspondido[mask_nao_correspondido] = nomes_override.isin(recursos['set_produtos_master']).to_numpy()
     
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Reestruturacao")
+    stats = relatar_matches(int(correspondido.sum()), len(df), 'NOME_PRODUTO_LIMPO', "Apos Override")
     stats_list.append(stats)
     
-    # ETAPA 4: Regras de negócio
-    print("\n" + "="*80)
-    print("ETAPA 4: REGRAS DE NEGOCIO")
-    print("="*80)
-    
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
-    print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
-    
-    tqdm.pandas(desc="Aplicando Regras")
-    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'].progress_apply(
-            lambda x: aplicar_regras_negocio(x, recursos['regras_negocio_json'])
+    # ETAPAS 1-4: cada nome distinto não correspondido passa pelas quatro
+    # transformações em sequência, parando assim que encontra a base mestre
+    # (como a máscara recalculada a cada etapa); a coluna é escrita uma vez
+    mask_nao_correspondido = ~correspondido
+    # None e NaN podem se fundir: a ETAPA 1 transforma ambos em ''
+    codigos, nomes = pd.factorize(
+        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'], use_na_sentinel=False
+    )
+    nomes = np.asarray(nomes, dtype=object)
+    linhas_por_nome = np.bincount(codigos, minlength=len(nomes))
+    linhas_correspondidas = int(correspondido.sum())
+    
+    etapas = [
+        (
+            "ETAPA 1: LIMPEZA DE LETRAS ISOLADAS", "Apos Limpeza Letras",
+            lambda nomes_pendentes: aplicar_em_distintos(
+                nomes_pendentes,
+                partial(
+                    limpar_letras_isoladas,
+                    letras_a_verificar=recursos['letras_a_verificar'],
+                    termos_permitidos=recursos['termos_permitidos']
+                ),
+                desc="Limpando Letras"
+            ),
+        ),
+        (
+            "ETAPA 2: EXPANSAO DE ABREVIACOES", "Apos Abreviacoes",
+            (lambda nomes_pendentes: expandir_abreviacoes_vetorizado(
+                nomes_pendentes,
+                recursos['abrev_pattern'],
+                recursos['abbreviation_mapping'],
+                recursos['abrev_pattern_arrow'],
+                desc="Expandindo Abreviac."
+            )) if recursos['abrev_pattern'] else None,
+        ),
+        (
+            "ETAPA 3: REESTRUTURACAO QUIMICA", "Apos Reestruturacao",
+            lambda nomes_pendentes: aplicar_em_distintos(
+                nomes_pendentes,
+                partial(reestruturar_nome_quimico, termos_quimicos_set=recursos['termos_quimicos_set']),
+                desc="Reestruturando"
+            ),
+        ),
+        (
+            "ETAPA 4: REGRAS DE NEGOCIO", "Apos Regras Negocio",
+            lambda nomes_pendentes: aplicar_regras_negocio_vetorizado(
+                nomes_pendentes, recursos['regras_negocio_compiladas']
+            ),
+        ),
+    ]
+    
+    correspondidos = pd.Series(nomes, dtype=object).isin(recursos['set_produtos_master']).to_numpy()
+    for titulo, nome_etapa, transformar in etapas:
+        print("\n" + "="*80)
+        print(titulo)
+        print("="*80)
+        
+        pendentes = ~correspondidos
+        print(f"[INFO] Processando {linhas_por_nome[pendentes].sum():,} linhas "
+              f"({pendentes.sum():,} nomes distintos)...")
+        
+        if transformar is not None:
+            transformados = transformar(pd.Series(nomes[pendentes], dtype=object))
+            nomes[pendentes] = transformados.to_numpy(dtype=object)
+            correspondidos[pendentes] = transformados.isin(recursos['set_produtos_master']).to_numpy()
+        else:
+            print("[AVISO] Sem abreviacoes para expandir")
+        
+        stats = relatar_matches(
+            linhas_correspondidas + int(linhas_por_nome[correspondidos].sum()), len(df),
+            'NOME_PRODUTO_LIMPO', nome_etapa
         )
+        stats_list.append(stats)
     
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Regras Negocio")
-    stats_list.append(stats)
+    df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = pd.Series(
+        nomes[codigos], index=df.index[mask_nao_correspondido], dtype=object
+    )
+    correspondido[mask_nao_correspondido] = correspondidos[codigos]
     
     # ETAPA 5: Dicionário fuzzy
     print("\n" + "="*80)
     print("ETAPA 5: DICIONARIO FUZZY")
     print("="*80)
     
-    mask_nao_correspondido = ~df['NOME_PRODUTO_LIMPO'].isin(recursos['set_produtos_master'])
+    mask_nao_correspondido = ~correspondido
     print(f"[INFO] Processando {mask_nao_correspondido.sum():,} linhas...")
     
     if recursos['dicionario_correcoes_fuzzy']:
-        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = \
-            df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'].replace(recursos['dicionario_correcoes_fuzzy'])
+        # map + fillna: uma consulta de hash por linha (o replace com dicionário
+        # compara a coluna com cada chave); os valores do JSON nunca são nulos
+        nomes_atuais = df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO']
+        corrigidos = nomes_atuais.map(recursos['dicionario_correcoes_fuzzy'])
+        df.loc[mask_nao_correspondido, 'NOME_PRODUTO_LIMPO'] = corrigidos.fillna(nomes_atuais)
+        # Só as linhas corrigidas podem ter passado a corresponder
+        alterados = corrigidos.notna().to_numpy()
+        linhas_alteradas = np.flatnonzero(mask_nao_correspondido)[alterados]
+        correspondido[linhas_alteradas] = corrigidos[alterados].isin(recursos['set_produtos_master']).to_numpy()
     else:
         print("[AVISO] Dicionario fuzzy vazio")
     
-    stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Apos Dicionario Fuzzy")
+    stats = relatar_matches(int(correspondido.sum()), len(df), 'NOME_PRODUTO_LIMPO', "Apos Dicionario Fuzzy")
     stats_list.append(stats)
     
-    # ETAPA 6: Limpeza final
+    # ETAPA 6: Limpeza final (altera todas as linhas: verificação completa)
     print("\n" + "="*80)
     print("ETAPA 6: LIMPEZA FINAL")
     print("="*80)
     
-    df['NOME_PRODUTO_LIMPO'] = (
-        df['NOME_PRODUTO_LIMPO']
-        .str.replace(r'\s+', ' ', regex=True)
-        .str.strip(';+ ')
-        .str.slice(0, 100)
-    )
+    df['NOME_PRODUTO_LIMPO'] = limpar_nomes_final(df['NOME_PRODUTO_LIMPO'])
     
     stats = verificar_matches(df, recursos['set_produtos_master'], 'NOME_PRODUTO_LIMPO', "Resultado Final")
     stats_list.append(stats)
@@ -527,8 +786,10 @@ def processar_refinamento_nomes(
     # Localizar arquivo de entrada
     if arquivo_entrada is None:
         print("\n[INFO] Procurando arquivo de entrada...")
-        # Busca primeiro arquivo SEM timestamp
-        arquivo_entrada = os.path.join(diretorio_saida, "df_etapa10_trabalhando_nomes.zip")
+        # Busca primeiro arquivo SEM timestamp (Parquet atual, depois o ZIP antigo)
+        arquivo_entrada = os.path.join(diretorio_saida, "df_etapa10_trabalhando_nomes.parquet")
+        if not os.path.exists(arquivo_entrada):
+            arquivo_entrada = os.path.join(diretorio_saida, "df_etapa10_trabalhando_nomes.zip")
         
         if not os.path.exists(arquivo_entrada):
             # Fallback: procura com timestamp
@@ -538,7 +799,7 @@ def processar_refinamento_nomes(
             ], reverse=True)
             
             if not arquivos:
-                print("[ERRO] Nenhum arquivo 'df_etapa10_trabalhando_nomes.zip' encontrado.")
+                print("[ERRO] Nenhum arquivo 'df_etapa10_trabalhando_nomes' encontrado.")
                 return None
             
             arquivo_entrada = os.path.join(diretorio_saida, arquivos[0])
@@ -547,7 +808,10 @@ def processar_refinamento_nomes(
     
     # Carregar dados
     print(f"\n[INFO] Carregando dados...")
-    df = pd.read_csv(arquivo_entrada, sep=';', encoding='utf-8-sig')
+    if arquivo_entrada.lower().endswith('.parquet'):
+        df = ler_parquet_como_csv(arquivo_entrada)
+    else:
+        df = pd.read_csv(arquivo_entrada, sep=';', encoding='utf-8-sig')
     print(f"   [OK] Shape: {df.shape}")
     
     # Carregar recursos
@@ -557,19 +821,18 @@ def processar_refinamento_nomes(
     df = executar_refinamento_nomes(df, recursos)
     
     # Salvar resultado
-    nome_saida = f"df_etapa11_trabalhando_refinado.zip"
+    nome_saida = "df_etapa11_trabalhando_refinado.parquet"
     caminho_saida = os.path.join(diretorio_saida, nome_saida)
     
     print(f"\n[INFO] Salvando resultado...")
-    df.to_csv(
+    # Parquet colunar com zstd, como na saída da Etapa 10: a Etapa 12 lê
+    # sem parse de CSV
+    df.to_parquet(
         caminho_saida,
-        sep=';',
-        index=False,
-        encoding='utf-8-sig',
-        compression={
-            'method': 'zip',
-            'archive_name': f"df_trabalhando_refinado.csv"
-        }
+        engine='pyarrow',
+        compression='zstd',
+        compression_level=3,
+        index=False
     )
     
     tamanho = os.path.getsize(caminho_saida) / (1024 * 1024)
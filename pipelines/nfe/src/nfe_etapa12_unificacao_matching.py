@@ -26,6 +26,7 @@ import json
 from datetime import datetime
 from tqdm import tqdm
 from paths import DATA_DIR, SUPPORT_DIR, OUTPUT_DIR
+from leitura_csv import ler_parquet_como_csv
 
 
 def _resolver_anvisa_output_path():
@@ -330,7 +331,8 @@ def exportar_zip_fast(df, prefixo='df_final_trabalhando'):
     
     compression_opts = dict(
         method='zip',
-        archive_name=f"{prefixo}.csv"
+        archive_name=f"{prefixo}.csv",
+        compresslevel=1,
     )
     
     df.to_csv(
@@ -368,8 +370,10 @@ def processar_unificacao_matching():
     print("\n[INFO] Carregando df_trabalhando_refinado...")
     processed_dir = DATA_DIR / 'processed'
     
-    # MODIFICADO: Busca arquivo SEM timestamp (overwriting)
-    arquivo_path = processed_dir / 'df_etapa11_trabalhando_refinado.zip'
+    # MODIFICADO: Busca arquivo SEM timestamp (overwriting); Parquet atual, depois o ZIP antigo
+    arquivo_path = processed_dir / 'df_etapa11_trabalhando_refinado.parquet'
+    if not arquivo_path.exists():
+        arquivo_path = processed_dir / 'df_etapa11_trabalhando_refinado.zip'
     
     if not arquivo_path.exists():
         # Fallback: procura por arquivos com timestamp (compatibilidade)
@@ -382,12 +386,15 @@ def processar_unificacao_matching():
     latest_zip = arquivo_path
     print(f"[INFO] Carregando: {latest_zip.name}")
     
-    # Ler CSV de dentro do ZIP (sep=';' conforme salvo no refinamento)
-    import zipfile
-    with zipfile.ZipFile(latest_zip, 'r') as zip_ref:
-        csv_name = zip_ref.namelist()[0]  # Pega o primeiro (único) CSV
-        with zip_ref.open(csv_name) as f:
-            df = pd.read_csv(f, sep=';')
+    if latest_zip.suffix == '.parquet':
+        df = ler_parquet_como_csv(latest_zip)
+    else:
+        # Ler CSV de dentro do ZIP (sep=';' conforme salvo no refinamento)
+        import zipfile
+        with zipfile.ZipFile(latest_zip, 'r') as zip_ref:
+            csv_name = zip_ref.namelist()[0]  # Pega o primeiro (único) CSV
+            with zip_ref.open(csv_name) as f:
+                df = pd.read_csv(f, sep=';')
     
     print(f"   [OK] Carregado com sucesso!")
     print(f"   Shape: {df.shape}")
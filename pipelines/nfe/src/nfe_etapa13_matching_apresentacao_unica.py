@@ -466,7 +466,8 @@ def exportar_zip_fast(df, prefixo='df_match_apresentacao_unica'):
     
     compression_opts = dict(
         method='zip',
-        archive_name=f"{prefixo}.csv"
+        archive_name=f"{prefixo}.csv",
+        compresslevel=1,
     )
     
     df.to_csv(
@@ -407,20 +407,18 @@ def exportar_resultados(df_ia, df_final):
     
     # 1. Exportar extração da IA
     print(f"\n[1/2] Salvando: {OUTPUT_IA_ZIP.name}")
-    with zipfile.ZipFile(OUTPUT_IA_ZIP, 'w', zipfile.ZIP_DEFLATED) as z:
-        csv_buffer = io.StringIO()
-        df_ia.to_csv(csv_buffer, sep=';', index=False)
-        z.writestr('df_etapa14_extracao_ia.csv', csv_buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_IA_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open('df_etapa14_extracao_ia.csv', 'w', force_zip64=True) as csv_file:
+            df_ia.to_csv(csv_file, sep=';', index=False)
     
     tamanho_ia = OUTPUT_IA_ZIP.stat().st_size / (1024 * 1024)
     print(f"  -> {len(df_ia):,} registros, {tamanho_ia:.2f} MB")
     
     # 2. Exportar DataFrame final enriquecido
     print(f"\n[2/2] Salvando: {OUTPUT_FINAL_ZIP.name}")
-    with zipfile.ZipFile(OUTPUT_FINAL_ZIP, 'w', zipfile.ZIP_DEFLATED) as z:
-        csv_buffer = io.StringIO()
-        df_final.to_csv(csv_buffer, sep=';', index=False)
-        z.writestr('df_etapa14_final_enriquecido.csv', csv_buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_FINAL_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open('df_etapa14_final_enriquecido.csv', 'w', force_zip64=True) as csv_file:
+            df_final.to_csv(csv_file, sep=';', index=False)
     
     tamanho_final = OUTPUT_FINAL_ZIP.stat().st_size / (1024 * 1024)
     print(f"  -> {len(df_final):,} registros, {tamanho_final:.2f} MB")
@@ -18,7 +18,6 @@ import zipfile
 import os
 import time
 import re
-import io
 from pathlib import Path
 import sys
 from rapidfuzz import process, fuzz
@@ -548,10 +547,9 @@ def exportar_resultado(df_resultado):
     
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     
-    with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED) as z:
-        csv_buffer = io.StringIO()
-        df_resultado.to_csv(csv_buffer, sep=';', index=False)
-        z.writestr('df_etapa15_resultado_matching_hibrido.csv', csv_buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open('df_etapa15_resultado_matching_hibrido.csv', 'w', force_zip64=True) as csv_file:
+            df_resultado.to_csv(csv_file, sep=';', index=False)
     
     tamanho = OUTPUT_ZIP.stat().st_size / (1024 * 1024)
     print(f"[OK] Exportado: {OUTPUT_ZIP.name}")
@@ -17,7 +17,6 @@ import pandas as pd
 import zipfile
 import os
 import time
-import io
 from pathlib import Path
 import sys
 from paths import DATA_DIR
@@ -165,13 +164,20 @@ def particionar_resultados(df):
     
     # Criar mascara: match bem-sucedido tem PRODUTO preenchido
     mask_matched = df['PRODUTO'].notna()
+    n_true = int(mask_matched.sum())
     
-    df_matched = df[mask_matched].copy()
-    df_restante = df[~mask_matched].copy()
+    # Casos degenerados (nenhum/todos com match) dispensam mascara + copia
+    if n_true == 0:
+        df_matched, df_restante = df.iloc[:0], df
+    elif n_true == len(df):
+        df_matched, df_restante = df, df.iloc[:0]
+    else:
+        df_matched = df[mask_matched].copy()
+        df_restante = df[~mask_matched].copy()
     
     total = len(df)
-    n_matched = len(df_matched)
-    n_restante = len(df_restante)
+    n_matched = n_true
+    n_restante = total - n_true
     
     pct_matched = (n_matched / total * 100) if total > 0 else 0
     pct_restante = (n_restante / total * 100) if total > 0 else 0
@@ -193,10 +199,9 @@ def exportar_dataframe(df, output_path, csv_name):
         print(f"[AVISO] DataFrame vazio - pulando {csv_name}")
         return
     
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as z:
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, sep=';', index=False)
-        z.writestr(csv_name, csv_buffer.getvalue())
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open(csv_name, 'w', force_zip64=True) as csv_file:
+            df.to_csv(csv_file, sep=';', index=False)
     
     tamanho = output_path.stat().st_size / (1024 * 1024)
     print(f"[OK] Exportado: {output_path.name}")
@@ -261,6 +266,9 @@ def gerar_relatorio(df_original, df_matched, df_restante, df_ia):
     n_ia = len(df_ia)
     
     print(f"\nTotal processado: {total:,} registros")
+    if total == 0:
+        print("[AVISO] Nenhum registro processado - relatorio vazio")
+        return
     print(f"\nResultados:")
     print(f"  1. Matched (com correspondencia ANVISA):")
     print(f"     -> {n_matched:,} registros ({n_matched/total*100:.1f}%)")
@@ -270,11 +278,12 @@ def gerar_relatorio(df_original, df_matched, df_restante, df_ia):
     print(f"     -> {n_ia:,} registros")
     
     if n_matched > 0 and 'match_score' in df_original.columns:
-        df_with_score = df_original[df_original['match_score'].notna()]
-        if len(df_with_score) > 0:
-            score_medio = df_with_score['match_score'].mean()
-            score_min = df_with_score['match_score'].min()
-            score_max = df_with_score['match_score'].max()
+        # mean/min/max ja ignoram NaN: nao e preciso filtrar (e copiar) o DataFrame
+        scores = df_original['match_score']
+        if scores.notna().any():
+            score_medio = scores.mean()
+            score_min = scores.min()
+            score_max = scores.max()
             
             print(f"\nQualidade dos Matches:")
             print(f"  Score medio: {score_medio:.3f}")
@@ -416,10 +416,9 @@ def exportar_consolidado(df):
     print(f"\n[1/2] Criando arquivo ZIP: {OUTPUT_ZIP.name}")
     
     # Criar ZIP com compressão
-    with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED) as z:
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, sep=';', index=False, encoding='utf-8')
-        z.writestr('df_etapa17_consolidado_final.csv', csv_buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        with z.open('df_etapa17_consolidado_final.csv', 'w', force_zip64=True) as csv_file:
+            df.to_csv(csv_file, sep=';', index=False, encoding='utf-8')
     
     # Calcular tamanhos
     tamanho_memoria_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
@@ -12,9 +12,9 @@ Output: df_etapa18_sobrepreco.zip
 
 from __future__ import annotations
 
-import io
 import zipfile
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import pandas as pd
@@ -153,21 +153,32 @@ def exportar_dataframe(df: pd.DataFrame) -> None:
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED) as zf:
-        buffer = io.StringIO()
-        df.to_csv(buffer, sep=";", index=False, encoding="utf-8")
-        zf.writestr(CSV_NAME, buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        with zf.open(CSV_NAME, "w", force_zip64=True) as csv_file:
+            df.to_csv(csv_file, sep=";", index=False, encoding="utf-8")
 
     tamanho_zip = OUTPUT_ZIP.stat().st_size / (1024 * 1024)
     print(f"[OK] Arquivo salvo: {OUTPUT_ZIP.name} ({tamanho_zip:.2f} MB)")
 
 
-def main() -> bool:
-    try:
+def processar(df: Optional[pd.DataFrame] = None, salvar: bool = True) -> pd.DataFrame:
+    """Executa a etapa sobre ``df`` (ou sobre o ZIP da etapa 17) e retorna o resultado.
+
+    Com ``salvar=False`` o ZIP de saída não é gravado, permitindo que o
+    orquestrador encadeie as etapas 18-20 em memória.
+    """
+    if df is None:
         df = carregar_dados()
-        df_enriquecido = calcular_razao(df)
-        gerar_resumos(df_enriquecido)
+    df_enriquecido = calcular_razao(df)
+    gerar_resumos(df_enriquecido)
+    if salvar:
         exportar_dataframe(df_enriquecido)
+    return df_enriquecido
+
+
+def main() -> bool:
+    try:
+        processar()
         print("\n[SUCESSO] Etapa 18 concluída!")
         return True
     except Exception as exc:  # pragma: no cover - logging informativo
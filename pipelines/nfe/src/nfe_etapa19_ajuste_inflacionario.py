@@ -11,7 +11,6 @@ Output: df_etapa19_valores_ajustados.zip
 
 from __future__ import annotations
 
-import io
 import os
 import zipfile
 from pathlib import Path
@@ -47,7 +46,9 @@ def carregar_dataframe() -> pd.DataFrame:
         if not csv_name:
             raise ValueError("Nenhum CSV encontrado no arquivo da Etapa 18.")
         with zf.open(csv_name) as csv_file:
-            df = pd.read_csv(csv_file, sep=";", low_memory=False)
+            # round_trip: os floats gravados pela etapa 18 (repr) voltam ao mesmo
+            # valor, como no encadeamento em memória das etapas 18-20
+            df = pd.read_csv(csv_file, sep=";", low_memory=False, float_precision="round_trip")
 
     print(f"[OK] Registros carregados: {len(df):,}")
     return df
@@ -97,7 +98,9 @@ def aplicar_ajuste(df: pd.DataFrame, fatores: pd.DataFrame, fator_coluna: Option
     print(f"APLICANDO FATOR DE AJUSTE: {fator_col}")
     print("=" * 80)
 
-    df_proc = df.copy()
+    # PRECO_MAXIMO_REFINADO é idêntico a TETO_DE_PRECO; removê-lo já na cópia
+    # evita carregá-lo pelo merge e pelas multiplicações seguintes
+    df_proc = df.drop(columns=["PRECO_MAXIMO_REFINADO"], errors="ignore")
     df_proc["data_emissao"] = pd.to_datetime(df_proc.get("data_emissao"), errors="coerce")
     if "ano_emissao" not in df_proc.columns or "mes_emissao" not in df_proc.columns:
         df_proc["ano_emissao"] = df_proc["data_emissao"].dt.year
@@ -108,6 +111,8 @@ def aplicar_ajuste(df: pd.DataFrame, fatores: pd.DataFrame, fator_coluna: Option
         on=["ano_emissao", "mes_emissao"],
         how="left",
     )
+    # ano/mes só servem de chave do merge
+    df_proc.drop(columns=["ano_emissao", "mes_emissao"], inplace=True, errors="ignore")
 
     df_proc[fator_col] = pd.to_numeric(df_proc[fator_col], errors="coerce").fillna(1.0)
 
@@ -119,11 +124,7 @@ def aplicar_ajuste(df: pd.DataFrame, fatores: pd.DataFrame, fator_coluna: Option
 
     # Limpa colunas auxiliares
     colunas_para_remover = [c for c in df_proc.columns if c.startswith("Multiplicative Factor")]
-    df_proc = df_proc.drop(columns=colunas_para_remover, errors="ignore")
-    # Remover colunas de ano/mes e colunas redundantes
-    df_proc = df_proc.drop(columns=["ano_emissao", "mes_emissao"], errors="ignore")
-    # PRECO_MAXIMO_REFINADO é idêntico a TETO_DE_PRECO; remover para simplificar o dataset
-    df_proc = df_proc.drop(columns=["PRECO_MAXIMO_REFINADO"], errors="ignore")
+    df_proc.drop(columns=colunas_para_remover, inplace=True, errors="ignore")
 
     variacao = df_proc["valor_produtos_ajustado"].sum() - df_proc["valor_produtos"].sum()
     print(f"Impacto total do ajuste: R$ {variacao:,.2f}")
@@ -133,10 +134,9 @@ def aplicar_ajuste(df: pd.DataFrame, fatores: pd.DataFrame, fator_coluna: Option
 
 def exportar(df: pd.DataFrame) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED) as zf:
-        buffer = io.StringIO()
-        df.to_csv(buffer, sep=";", index=False, encoding="utf-8")
-        zf.writestr(CSV_NAME, buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        with zf.open(CSV_NAME, "w", force_zip64=True) as csv_file:
+            df.to_csv(csv_file, sep=";", index=False, encoding="utf-8")
     print(f"[OK] Arquivo salvo: {OUTPUT_ZIP.name}")
 
 
@@ -166,13 +166,25 @@ def gerar_resumo(df: pd.DataFrame) -> None:
     print(f"[OK] Resumo salvo: {OUTPUT_RESUMO.name}")
 
 
-def main() -> bool:
-    try:
+def processar(df: Optional[pd.DataFrame] = None, salvar: bool = True) -> pd.DataFrame:
+    """Executa a etapa sobre ``df`` (ou sobre o ZIP da etapa 18) e retorna o resultado.
+
+    Com ``salvar=False`` o ZIP de saída não é gravado, permitindo que o
+    orquestrador encadeie as etapas 18-20 em memória.
+    """
+    if df is None:
         df = carregar_dataframe()
-        fatores = carregar_fatores()
-        df_ajustado = aplicar_ajuste(df, fatores, DEFAULT_FACTOR_COLUMN)
+    fatores = carregar_fatores()
+    df_ajustado = aplicar_ajuste(df, fatores, DEFAULT_FACTOR_COLUMN)
+    if salvar:
         exportar(df_ajustado)
-        gerar_resumo(df_ajustado)
+    gerar_resumo(df_ajustado)
+    return df_ajustado
+
+
+def main() -> bool:
+    try:
+        processar()
         print("\n[SUCESSO] Etapa 19 concluída!")
         return True
     except Exception as exc:  # pragma: no cover - logs de runtime
@@ -12,11 +12,13 @@ Output: df_etapa20_classificacao_esfera.zip
 from __future__ import annotations
 
 import gc
-import io
 import zipfile
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from paths import DATA_DIR, SUPPORT_DIR
 
@@ -29,22 +31,22 @@ CSV_NAME = "df_etapa20_classificacao_esfera.csv"
 ESFERA_FILE = SUPPORT_DIR / "classificacao_esfera.csv"
 ESFERA_URL = "https://drive.google.com/uc?id=11mCabQH1SXvdg4p5hW8q9QeZpRYQN-ic"
 
-EXCLUIR_NOME_FANTASIA = {
+EXCLUIR_NOME_FANTASIA = frozenset({
     "HOSPITAL DE GUARNICAO DE JOAO PESSOA",
     "BASE ADMINISTRATIVA DA GUARNICAO DE JOAO PESSOA",
-}
-EXCLUIR_RAZAO_SOCIAL = {
+})
+EXCLUIR_RAZAO_SOCIAL = frozenset({
     "FUNDACAO PARQUE TECNOLOGICO DA PARAIBA",
     "INSTITUTO DOS CEGOS DA PARAIBA ADALGISA CUNHA",
     "ESPACO CIDADANIA E OPORTUNIDADES SOCIAIS",
-}
+})
 ATUALIZAR_PARA_MUNICIPAL = {
-    "nome_fantasia_destinatario": {
+    "nome_fantasia_destinatario": frozenset({
         "FARMADANTAS",
         "INTERVENCAO PUBLICA",
         "PREFEITURA MUNICIPAL DE TRIUNFO",
-    },
-    "razao_social_destinatario": {
+    }),
+    "razao_social_destinatario": frozenset({
         "INSTITUTO ACQUA - ACAO, CIDADANIA, QUALIDADE URBANA E AMBIENTAL",
         "MUNICIPIO DE QUEIMADAS",
         "MUNICIPIO DE SANTA LUZIA",
@@ -58,12 +60,40 @@ ATUALIZAR_PARA_MUNICIPAL = {
         "PAULO DOUGLAS DE AZEVEDO TEOTONIO LTDA",
         "MARIA JOSE DE ARAUJO SILVA CUNHA",
         "CONGREGACAO DAS IRMAS DOS POBRES DE SANTA CATARINA DE SENA - PROVINCIA SAGRADO CORACAO DE JESUS",
-    },
+    }),
 }
 ATUALIZAR_PARA_ESTADUAL = {
-    "razao_social_destinatario": {
+    "razao_social_destinatario": frozenset({
         "CRUZ VERMELHA BRASILEIRA FILIAL DO ESTADO DO RIO GRANDE DO SUL",
-    }
+    }),
+}
+EXCLUIR_POR_COLUNA = {
+    "nome_fantasia_destinatario": EXCLUIR_NOME_FANTASIA,
+    "razao_social_destinatario": EXCLUIR_RAZAO_SOCIAL,
+}
+
+# Códigos de ação das regras manuais (0 = nenhuma regra)
+ACAO_EXCLUIR = 1
+ACAO_MUNICIPAL = 2
+ACAO_ESTADUAL = 3
+
+
+def _montar_tabela_acoes(coluna: str) -> Tuple[pa.Array, pa.Array]:
+    """Une as regras de uma coluna em (nomes, códigos) para um único ``index_in``."""
+    regras = (
+        (ACAO_EXCLUIR, EXCLUIR_POR_COLUNA.get(coluna, frozenset())),
+        (ACAO_MUNICIPAL, ATUALIZAR_PARA_MUNICIPAL.get(coluna, frozenset())),
+        (ACAO_ESTADUAL, ATUALIZAR_PARA_ESTADUAL.get(coluna, frozenset())),
+    )
+    nomes = [nome for _, conjunto in regras for nome in sorted(conjunto)]
+    codigos = [codigo for codigo, conjunto in regras for _ in conjunto]
+    return pa.array(nomes, type=pa.string()), pa.array(codigos, type=pa.int8())
+
+
+# Tabelas de lookup montadas uma única vez, na importação do módulo
+TABELA_ACOES: Dict[str, Tuple[pa.Array, pa.Array]] = {
+    coluna: _montar_tabela_acoes(coluna)
+    for coluna in ("nome_fantasia_destinatario", "razao_social_destinatario")
 }
 
 
@@ -71,6 +101,19 @@ def _normalize(series: pd.Series) -> pd.Series:
     return series.fillna("").astype(str).str.strip().str.upper()
 
 
+def _normalize_arrow(series: pd.Series) -> pa.Array:
+    """Versão Arrow de ``_normalize``: strip + upper em kernels C++."""
+    valores = pa.array(series.fillna("").astype(str).to_numpy(dtype=object), type=pa.string())
+    return pc.utf8_upper(pc.utf8_trim_whitespace(valores))
+
+
+def _codigos_acao(series: pd.Series, coluna: str) -> np.ndarray:
+    """Retorna, por linha, o código de ação da regra manual (0 quando não há regra)."""
+    nomes, codigos = TABELA_ACOES[coluna]
+    posicoes = pc.index_in(_normalize_arrow(series), value_set=nomes)
+    return pc.fill_null(pc.take(codigos, posicoes), 0).to_numpy(zero_copy_only=False)
+
+
 def carregar_dataframe() -> pd.DataFrame:
     if not INPUT_ZIP.exists():
         raise FileNotFoundError(
@@ -86,7 +129,9 @@ def carregar_dataframe() -> pd.DataFrame:
         if not csv_name:
             raise ValueError("Nenhum CSV encontrado no arquivo da Etapa 19.")
         with zf.open(csv_name) as csv_file:
-            df = pd.read_csv(csv_file, sep=";", low_memory=False)
+            # round_trip: os floats gravados pela etapa 19 (repr) voltam ao mesmo
+            # valor, como no encadeamento em memória das etapas 18-20
+            df = pd.read_csv(csv_file, sep=";", low_memory=False, float_precision="round_trip")
 
     print(f"[OK] Registros carregados: {len(df):,}")
     return df
@@ -132,22 +177,21 @@ def classificar(df: pd.DataFrame, tabela_esfera: pd.DataFrame) -> pd.DataFrame:
     )
     df_proc.drop(columns=["cpf_cnpj_limpo", "CNPJ_limpo"], inplace=True, errors="ignore")
 
+    # Uma única passada de lookup por coluna resolve todas as regras manuais
+    acoes = [_codigos_acao(df_proc[coluna], coluna) for coluna in TABELA_ACOES]
+
+    print("\n--- Aplicando atualizações manuais ---")
+    for codigo, esfera in ((ACAO_MUNICIPAL, 1), (ACAO_ESTADUAL, 2)):
+        mask = np.logical_or.reduce([acao == codigo for acao in acoes])
+        df_proc.loc[mask, "ID_ESFERA"] = esfera
+
     print("\n--- Aplicando filtros de exclusão ---")
     antes = len(df_proc)
-    mask_nf = ~_normalize(df_proc["nome_fantasia_destinatario"]).isin(EXCLUIR_NOME_FANTASIA)
-    mask_rs = ~_normalize(df_proc["razao_social_destinatario"]).isin(EXCLUIR_RAZAO_SOCIAL)
-    df_proc = df_proc[mask_nf & mask_rs]
+    excluir = np.logical_or.reduce([acao == ACAO_EXCLUIR for acao in acoes])
+    df_proc = df_proc[~excluir]
     depois = len(df_proc)
     print(f"Registros removidos: {antes - depois:,}")
 
-    print("\n--- Aplicando atualizações manuais ---")
-    for coluna, nomes in ATUALIZAR_PARA_MUNICIPAL.items():
-        normalized = _normalize(df_proc[coluna])
-        df_proc.loc[normalized.isin(nomes), "ID_ESFERA"] = 1
-    for coluna, nomes in ATUALIZAR_PARA_ESTADUAL.items():
-        normalized = _normalize(df_proc[coluna])
-        df_proc.loc[normalized.isin(nomes), "ID_ESFERA"] = 2
-
     df_proc["ID_ESFERA"] = pd.to_numeric(df_proc["ID_ESFERA"], errors="coerce")
     df_proc["ID_ESFERA"] = df_proc["ID_ESFERA"].fillna(1)
     df_proc["ID_ESFERA"] = df_proc["ID_ESFERA"].astype("Int64")
@@ -157,10 +201,9 @@ def classificar(df: pd.DataFrame, tabela_esfera: pd.DataFrame) -> pd.DataFrame:
 
 def exportar(df: pd.DataFrame) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED) as zf:
-        buffer = io.StringIO()
-        df.to_csv(buffer, sep=";", index=False, encoding="utf-8")
-        zf.writestr(CSV_NAME, buffer.getvalue())
+    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        with zf.open(CSV_NAME, "w", force_zip64=True) as csv_file:
+            df.to_csv(csv_file, sep=";", index=False, encoding="utf-8")
     print(f"[OK] Arquivo salvo: {OUTPUT_ZIP.name}")
 
 
@@ -175,6 +218,22 @@ def gerar_resumo(df: pd.DataFrame) -> None:
     print(f"[OK] Distribuição salva: {OUTPUT_RESUMO.name}")
 
 
+def processar(df: Optional[pd.DataFrame] = None, salvar: bool = True) -> pd.DataFrame:
+    """Executa a etapa sobre ``df`` (ou sobre o ZIP da etapa 19) e retorna o resultado.
+
+    Última etapa do encadeamento em memória: o orquestrador chama com
+    ``salvar=True`` para materializar o ZIP consumido pela etapa 21.
+    """
+    if df is None:
+        df = carregar_dataframe()
+    tabela = garantir_base_esfera()
+    df_esfera = classificar(df, tabela)
+    if salvar:
+        exportar(df_esfera)
+    gerar_resumo(df_esfera)
+    return df_esfera
+
+
 def main() -> bool:
     try:
         for nome in ("df_analise", "df_merged"):
@@ -182,11 +241,7 @@ def main() -> bool:
                 del globals()[nome]
         gc.collect()
 
-        df = carregar_dataframe()
-        tabela = garantir_base_esfera()
-        df_esfera = classificar(df, tabela)
-        exportar(df_esfera)
-        gerar_resumo(df_esfera)
+        processar()
         print("\n[SUCESSO] Etapa 20 concluída!")
         return True
     except Exception as exc:  # pragma: no cover
@@ -9,7 +9,7 @@ Input esperado:
     data/processed/df_etapa20_classificacao_esfera.zip
 
 Saídas:
-    data/processed/df_etapa21_unidades_padronizadas.zip
+    data/processed/df_etapa21_unidades_padronizadas.parquet (zstd, lido pela Etapa 22)
     data/processed/df_etapa21_unidades_resumo.csv (top 30 unidades por fase)
     data/processed/df_etapa21_unidades_metricas.csv (estatísticas da etapa)
 """
@@ -17,21 +17,21 @@ Saídas:
 from __future__ import annotations
 
 import gc
-import io
-import zipfile
-from typing import Dict, Tuple
+from typing import Dict, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
+from leitura_csv import ler_csv_zip_arrow
 from paths import DATA_DIR
 
 INPUT_ZIP = DATA_DIR / "processed" / "df_etapa20_classificacao_esfera.zip"
 OUTPUT_DIR = DATA_DIR / "processed"
-OUTPUT_ZIP = OUTPUT_DIR / "df_etapa21_unidades_padronizadas.zip"
+OUTPUT_PARQUET = OUTPUT_DIR / "df_etapa21_unidades_padronizadas.parquet"
 OUTPUT_RESUMO = OUTPUT_DIR / "df_etapa21_unidades_resumo.csv"
 OUTPUT_METRICAS = OUTPUT_DIR / "df_etapa21_unidades_metricas.csv"
-CSV_NAME = "df_etapa21_unidades_padronizadas.csv"
 
 MAPA_UNIDADES: Dict[str, str] = {
     "CZ": "CAIXA", "CX": "CAIXA", "CX1": "CAIXA", "CX U": "CAIXA", "3/": "CAIXA", "GO": "CAIXA",
@@ -116,6 +116,82 @@ MAPA_CONSOLIDACAO_UNIDADES: Dict[str, str] = {
 
 MAPA_FINAL: Dict[str, str] = {"MIL": "CAIXA"}
 
+# Mapas como Series (índice com hash pronto), montadas uma vez na importação
+SERIE_MAPA_UNIDADES = pd.Series(MAPA_UNIDADES, dtype=object)
+SERIE_MAPA_CONSOLIDACAO = pd.Series(MAPA_CONSOLIDACAO_UNIDADES, dtype=object)
+SERIE_MAPA_FINAL = pd.Series(MAPA_FINAL, dtype=object)
+
+# Unidades listadas por fase em df_etapa21_unidades_resumo.csv
+TOP_UNIDADES_RESUMO = 30
+
+# Tipos fixados na leitura Arrow: a chave da NFe tem 44 dígitos e seria inferida
+# como float64 (perdendo dígitos); ``unidade`` já chega como categórica.
+TIPOS_LEITURA: Dict[str, pa.DataType] = {
+    "chave_codigo": pa.string(),
+    "unidade": pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+def _remapear_categorias(serie: pd.Series, categorias: Sequence[object]) -> pd.Series:
+    """Troca as categorias de ``serie`` por ``categorias`` (mesma posição).
+
+    Categorias que passam a coincidir são fundidas; as linhas são remapeadas
+    por código inteiro, sem operação de string por registro.
+    """
+    categorica = serie.astype("category")
+    novas_categorias = pd.unique(pd.Series(categorias, dtype=object))
+    codigo_por_categoria = pd.Index(novas_categorias).get_indexer(categorias)
+
+    codigos = categorica.cat.codes.to_numpy()
+    novos_codigos = np.where(codigos >= 0, codigo_por_categoria[codigos], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(novos_codigos, categories=novas_categorias),
+        index=serie.index,
+        name=serie.name,
+    )
+
+
+def _mapear_categorias(serie: pd.Series, mapa: pd.Series) -> pd.Series:
+    """Aplica ``mapa`` sobre as categorias de ``serie`` (valores fora do mapa são mantidos)."""
+    categorica = serie.astype("category")
+    categorias = categorica.cat.categories
+    mapeadas = mapa.reindex(categorias).to_numpy()
+    fora_do_mapa = pd.isna(mapeadas)
+    mapeadas[fora_do_mapa] = categorias.to_numpy(dtype=object)[fora_do_mapa]
+    return _remapear_categorias(categorica, mapeadas)
+
+
+def _contar_unidades(serie: pd.Series, limite: int = TOP_UNIDADES_RESUMO) -> pd.Series:
+    """As ``limite`` unidades mais frequentes (maior primeiro), via códigos da categórica.
+
+    ``np.bincount`` sobre os códigos custa uma passada de inteiros; o top é
+    escolhido com ``argpartition`` e só ele é ordenado. Empates seguem a
+    ordem da primeira linha de cada unidade, como no ``value_counts``.
+    """
+    categorica = serie.astype("category")
+    categorias = categorica.cat.categories
+    codigos = categorica.cat.codes.to_numpy()
+    codigos = codigos[codigos >= 0]
+    contagens = np.bincount(codigos, minlength=len(categorias))
+
+    # Posição de cada categoria na ordem de aparição (pd.unique mantém a ordem)
+    ordem_aparicao = np.zeros(len(categorias), dtype=np.int64)
+    aparecem = pd.unique(codigos)
+    ordem_aparicao[aparecem] = np.arange(len(aparecem))
+
+    # Chave única por categoria: mais registros primeiro; no empate, a que aparece antes
+    chave = contagens.astype(np.int64) * len(categorias) - ordem_aparicao
+    usados = np.flatnonzero(contagens > 0)
+    if len(usados) > limite:
+        usados = usados[np.argpartition(-chave[usados], limite - 1)[:limite]]
+    usados = usados[np.argsort(-chave[usados])]
+
+    return pd.Series(
+        contagens[usados],
+        index=pd.Index(categorias[usados], name="unidade"),
+        name="count",
+    )
+
 
 def carregar_dataframe() -> pd.DataFrame:
     if not INPUT_ZIP.exists():
@@ -127,158 +203,188 @@ def carregar_dataframe() -> pd.DataFrame:
     print("CARREGANDO DADOS DA ETAPA 20")
     print("=" * 80)
 
-    with zipfile.ZipFile(INPUT_ZIP, "r") as zf:
-        csv_name = next((n for n in zf.namelist() if n.lower().endswith(".csv")), None)
-        if not csv_name:
-            raise ValueError("Nenhum CSV encontrado dentro do pacote da Etapa 20.")
-        with zf.open(csv_name) as csv_file:
-            df = pd.read_csv(csv_file, sep=";", low_memory=False)
+    # Parser Arrow (multithread); ZIP sem compressão é lido via mmap
+    df = ler_csv_zip_arrow(INPUT_ZIP, TIPOS_LEITURA)
 
     print(f"[OK] Registros carregados: {len(df):,}")
     return df
 
 
 def preparar_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
-    df_proc = df.copy()
+    """Normaliza tipos e ``unidade``. Altera ``df`` no próprio objeto."""
     for coluna in ("valor_produtos", "valor_unitario", "quantidade"):
-        df_proc[coluna] = pd.to_numeric(df_proc.get(coluna), errors="coerce")
+        serie = df.get(coluna)
+        if serie is None or not pd.api.types.is_numeric_dtype(serie):
+            df[coluna] = pd.to_numeric(serie, errors="coerce")
 
-    unidade_col = df_proc.get("unidade")
+    unidade_col = df.get("unidade")
     if unidade_col is None:
-        df_proc["unidade"] = ""
+        df["unidade"] = pd.Categorical([""] * len(df))
     else:
-        df_proc["unidade"] = unidade_col.astype(str).str.strip().str.upper()
-
-    contagem = df_proc["unidade"].value_counts(dropna=False)
-    return df_proc, contagem
+        # Categórica: strip/upper roda uma vez por unidade distinta, não por linha
+        unidade_col = unidade_col.astype("category")
+        if unidade_col.isna().any():
+            # Mantém o comportamento de astype(str): nulos viram "NAN"
+            if "nan" not in unidade_col.cat.categories:
+                unidade_col = unidade_col.cat.add_categories(["nan"])
+            unidade_col = unidade_col.fillna("nan")
+        # strip + upper nos kernels Arrow, sobre o dicionário de categorias
+        categorias = pa.array(unidade_col.cat.categories.astype(str), type=pa.string())
+        normalizadas = pc.utf8_upper(pc.utf8_trim_whitespace(categorias))
+        df["unidade"] = _remapear_categorias(unidade_col, normalizadas.to_pylist())
+
+    contagem = _contar_unidades(df["unidade"])
+    return df, contagem
+
+
+def _recalcular_valor_unitario(df: pd.DataFrame, mask: np.ndarray) -> None:
+    """valor_unitario = valor_produtos / quantidade nas linhas de ``mask`` (quantidade 0 gera NaN)."""
+    qtd = df["quantidade"].to_numpy(dtype=float)
+    valor_produtos = df["valor_produtos"].to_numpy(dtype=float)
+    valor_unitario = df["valor_unitario"].to_numpy(dtype=float, copy=True)
+    np.divide(valor_produtos, qtd, out=valor_unitario, where=mask & (qtd != 0))
+    valor_unitario[mask & (qtd == 0)] = np.nan
+    df["valor_unitario"] = valor_unitario
 
 
 def aplicar_correcao_unidade_180(df: pd.DataFrame) -> pd.DataFrame:
-    df_proc = df.copy()
-    mask_180 = df_proc["unidade"] == "180"
+    """Converte a unidade '180' em CAIXA. Altera ``df`` no próprio objeto."""
+    mask_180 = (df["unidade"] == "180").to_numpy()
     if mask_180.any():
         print("Aplicando correção especial para unidade '180'...")
         fator_conversao = 60.0
-        df_proc.loc[mask_180, "quantidade"] = df_proc.loc[mask_180, "quantidade"] / fator_conversao
-        denominador = df_proc.loc[mask_180, "quantidade"].replace(0, np.nan)
-        df_proc.loc[mask_180, "valor_unitario"] = (
-            df_proc.loc[mask_180, "valor_produtos"] / denominador
-        )
-        df_proc.loc[mask_180, "unidade"] = "CAIXA"
-    return df_proc
+        qtd = df["quantidade"].to_numpy(dtype=float, copy=True)
+        np.divide(qtd, fator_conversao, out=qtd, where=mask_180)
+        df["quantidade"] = qtd
+        _recalcular_valor_unitario(df, mask_180)
+        if "CAIXA" not in df["unidade"].cat.categories:
+            df["unidade"] = df["unidade"].cat.add_categories(["CAIXA"])
+        df.loc[mask_180, "unidade"] = "CAIXA"
+    return df
 
 
 def recalcular_valor_unitario_caixa(df: pd.DataFrame) -> pd.DataFrame:
-    df_proc = df.copy()
-    mask_caixa = df_proc["unidade"] == "CAIXA"
+    """Recalcula valor_unitario das linhas CAIXA. Altera ``df`` no próprio objeto."""
+    mask_caixa = (df["unidade"] == "CAIXA").to_numpy()
     if mask_caixa.any():
         print("Recalculando valor_unitario para registros com unidade 'CAIXA'...")
-        denominador = df_proc.loc[mask_caixa, "quantidade"].replace(0, np.nan)
-        df_proc.loc[mask_caixa, "valor_unitario"] = (
-            df_proc.loc[mask_caixa, "valor_produtos"] / denominador
-        )
-    return df_proc
+        _recalcular_valor_unitario(df, mask_caixa)
+    return df
 
 
 def padronizar_unidades(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
-    df_proc = df.copy()
-    df_proc["unidade_padronizada"] = df_proc["unidade"].map(MAPA_UNIDADES).fillna(df_proc["unidade"])
-    linhas_antes = len(df_proc)
-    df_proc = df_proc[~df_proc["unidade_padronizada"].isin(UNIDADES_PARA_REMOVER)].copy()
-    removidas = linhas_antes - len(df_proc)
-    df_proc["unidade"] = df_proc["unidade_padronizada"]
-    df_proc.drop(columns=["unidade_padronizada"], inplace=True)
-    return df_proc, removidas
+    """Aplica MAPA_UNIDADES e remove unidades descartadas.
+
+    Altera ``unidade`` em ``df``; se houver remoções, retorna um novo frame
+    apenas com as linhas mantidas.
+    """
+    df["unidade"] = _mapear_categorias(df["unidade"], SERIE_MAPA_UNIDADES)
+    linhas_antes = len(df)
+    remover = df["unidade"].isin(UNIDADES_PARA_REMOVER).to_numpy()
+    if remover.any():
+        df = df.take(np.flatnonzero(~remover))
+    removidas = linhas_antes - len(df)
+    df["unidade"] = df["unidade"].cat.remove_unused_categories()
+    return df, removidas
+
+
+def _calcular_score(quantidade: np.ndarray, valor_unitario: np.ndarray) -> np.ndarray:
+    """score = 2 * (log10(qtd) - log10(vu)), com NaN/inf zerados, em buffers reaproveitados."""
+    score = np.clip(quantidade, 1e-6, None)
+    score[np.isnan(score)] = 1.0
+    np.log10(score, out=score)
+
+    log_vu = np.clip(valor_unitario, 1e-6, None)
+    log_vu[np.isnan(log_vu)] = 1.0
+    np.log10(log_vu, out=log_vu)
+
+    with np.errstate(invalid="ignore"):  # inf - inf vira NaN e é zerado abaixo
+        np.subtract(score, log_vu, out=score)
+    np.multiply(score, 2.0, out=score)
+    return np.nan_to_num(score, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
 
 
 def aplicar_heuristicas(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
-    df_proc = df.copy()
-    df_proc["unidade"] = df_proc["unidade"].map(MAPA_CONSOLIDACAO_UNIDADES).fillna(df_proc["unidade"])
-
-    quantidade = df_proc["quantidade"].clip(lower=1e-6).fillna(1.0)
-    valor_unitario = df_proc["valor_unitario"].clip(lower=1e-6).fillna(1.0)
-    score = 2 * (np.log10(quantidade) - np.log10(valor_unitario))
-    score = score.replace([np.inf, -np.inf], 0.0)
-    df_proc["score"] = score.fillna(0.0)
-
-    unidades_originais = df_proc["unidade"].copy()
-
-    mask_ambigua_caixa = df_proc["unidade"].isin(["MISTO", "CAIXA"])
-    df_proc.loc[mask_ambigua_caixa & (df_proc["valor_unitario"] < 0.7), "unidade"] = "UNIDADES"
-    df_proc.loc[mask_ambigua_caixa & (df_proc["score"] > 2), "unidade"] = "UNIDADES"
-    df_proc.loc[mask_ambigua_caixa & (df_proc["quantidade"] > 13333), "unidade"] = "UNIDADES"
-    df_proc.loc[
-        mask_ambigua_caixa & (df_proc["valor_unitario"] < 5) & (df_proc["quantidade"] >= 3500),
-        "unidade",
-    ] = "UNIDADES"
-    df_proc.loc[
-        mask_ambigua_caixa & (df_proc["valor_unitario"] < 4) & (df_proc["quantidade"] >= 2600),
-        "unidade",
-    ] = "UNIDADES"
-    df_proc.loc[
-        mask_ambigua_caixa & (df_proc["valor_unitario"] < 3) & (df_proc["quantidade"] >= 1900),
-        "unidade",
-    ] = "UNIDADES"
-    df_proc.loc[
-        mask_ambigua_caixa & (df_proc["valor_unitario"] < 2) & (df_proc["quantidade"] >= 200),
-        "unidade",
-    ] = "UNIDADES"
-
-    mask_ambigua_unidade = df_proc["unidade"].isin(["MISTO", "UNIDADES"])
-    df_proc.loc[mask_ambigua_unidade & (df_proc["score"] < 0.33), "unidade"] = "CAIXA"
-    df_proc.loc[mask_ambigua_unidade & (df_proc["quantidade"] <= 3), "unidade"] = "CAIXA"
-    df_proc.loc[mask_ambigua_unidade & (df_proc["valor_unitario"] > 1500), "unidade"] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 4) & (df_proc["valor_unitario"] > 3),
-        "unidade",
-    ] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 5) & (df_proc["valor_unitario"] > 5),
-        "unidade",
-    ] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 6) & (df_proc["valor_unitario"] > 10),
-        "unidade",
-    ] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 7) & (df_proc["valor_unitario"] > 30),
-        "unidade",
-    ] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 8) & (df_proc["valor_unitario"] > 50),
-        "unidade",
-    ] = "CAIXA"
-    df_proc.loc[
-        mask_ambigua_unidade & (df_proc["quantidade"] <= 9) & (df_proc["valor_unitario"] > 75),
-        "unidade",
-    ] = "CAIXA"
-
-    df_proc.loc[df_proc["score"] <= 1, "unidade"] = "CAIXA"
-    df_proc.loc[df_proc["score"] > 2, "unidade"] = "UNIDADES"
-    df_proc.loc[df_proc["quantidade"] <= 3, "unidade"] = "CAIXA"
-    df_proc.loc[df_proc["unidade"].isin(["MISTO"]) & (df_proc["score"] <= 2), "unidade"] = "CAIXA"
-
-    df_proc["unidade"] = df_proc["unidade"].map(MAPA_FINAL).fillna(df_proc["unidade"])
-
-    mudancas = (unidades_originais != df_proc["unidade"]).sum()
-    df_proc.drop(columns=["score"], inplace=True)
-    return df_proc, mudancas
+    """Consolida unidades e aplica as heurísticas. Altera ``df`` no próprio objeto."""
+    df["unidade"] = _mapear_categorias(df["unidade"], SERIE_MAPA_CONSOLIDACAO)
+    # As heurísticas atribuem CAIXA/UNIDADES: as categorias precisam existir
+    faltantes = [c for c in ("CAIXA", "UNIDADES") if c not in df["unidade"].cat.categories]
+    df["unidade"] = df["unidade"].cat.add_categories(faltantes)
+
+    qtd = df["quantidade"].to_numpy(dtype=float)
+    vu = df["valor_unitario"].to_numpy(dtype=float)
+    score = _calcular_score(qtd, vu)
+
+    categorias = df["unidade"].cat.categories
+    codigos = df["unidade"].cat.codes.to_numpy()
+    # -2 nunca coincide com um código válido (MISTO pode não existir na base)
+    cod_misto = categorias.get_loc("MISTO") if "MISTO" in categorias else -2
+    cod_caixa = categorias.get_loc("CAIXA")
+    cod_unidades = categorias.get_loc("UNIDADES")
+
+    # Bloco 1: MISTO/CAIXA com perfil de unidade viram UNIDADES
+    vira_unidades = np.isin(codigos, [cod_misto, cod_caixa]) & (
+        (vu < 0.7)
+        | (score > 2)
+        | (qtd > 13333)
+        | ((vu < 5) & (qtd >= 3500))
+        | ((vu < 4) & (qtd >= 2600))
+        | ((vu < 3) & (qtd >= 1900))
+        | ((vu < 2) & (qtd >= 200))
+    )
+    # Bloco 2: MISTO/UNIDADES (inclusive as recém-convertidas) com perfil de caixa viram CAIXA
+    vira_caixa = (vira_unidades | np.isin(codigos, [cod_misto, cod_unidades])) & (
+        (score < 0.33)
+        | (qtd <= 3)
+        | (vu > 1500)
+        | ((qtd <= 4) & (vu > 3))
+        | ((qtd <= 5) & (vu > 5))
+        | ((qtd <= 6) & (vu > 10))
+        | ((qtd <= 7) & (vu > 30))
+        | ((qtd <= 8) & (vu > 50))
+        | ((qtd <= 9) & (vu > 75))
+    )
+    continua_misto = (codigos == cod_misto) & ~vira_unidades & ~vira_caixa
+
+    # Regras em ordem de prioridade (a primeira verdadeira vence), equivalente à
+    # cascata original em que a última atribuição prevalecia
+    condicoes = [
+        qtd <= 3,
+        score > 2,
+        score <= 1,
+        vira_caixa,
+        vira_unidades,
+        continua_misto & (score <= 2),
+    ]
+    escolhas = [cod_caixa, cod_unidades, cod_caixa, cod_caixa, cod_unidades, cod_caixa]
+    novos_codigos = np.select(condicoes, escolhas, default=codigos)
+
+    unidades_originais = df["unidade"]
+    df["unidade"] = pd.Categorical.from_codes(novos_codigos, categories=categorias)
+    df["unidade"] = _mapear_categorias(df["unidade"], SERIE_MAPA_FINAL).cat.remove_unused_categories()
+
+    mudancas = int((unidades_originais.to_numpy(dtype=object) != df["unidade"].to_numpy(dtype=object)).sum())
+    return df, mudancas
 
 
 def exportar_dataframe(df: pd.DataFrame) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(OUTPUT_ZIP, "w", zipfile.ZIP_DEFLATED) as zf:
-        buffer = io.StringIO()
-        df.to_csv(buffer, sep=";", index=False, encoding="utf-8")
-        zf.writestr(CSV_NAME, buffer.getvalue())
-    print(f"[OK] Arquivo salvo: {OUTPUT_ZIP.name}")
+    # Parquet colunar com zstd: arquivo menor e leitura sem parse de texto na Etapa 22
+    df.to_parquet(
+        OUTPUT_PARQUET,
+        engine="pyarrow",
+        compression="zstd",
+        compression_level=3,
+        index=False,
+    )
+    print(f"[OK] Arquivo salvo: {OUTPUT_PARQUET.name}")
 
 
 def _series_para_resumo(nome: str, serie: pd.Series) -> pd.DataFrame:
     if serie.empty:
         return pd.DataFrame({"etapa": [nome], "unidade": ["-"], "registros": [0]})
     top = (
-        serie.head(30)
+        serie.head(TOP_UNIDADES_RESUMO)
         .rename("registros")
         .reset_index()
         .rename(columns={"index": "unidade"})
@@ -330,10 +436,10 @@ def main() -> bool:
         df_corrigido = aplicar_correcao_unidade_180(df_prep)
         df_corrigido = recalcular_valor_unitario_caixa(df_corrigido)
         df_padronizado, removidas = padronizar_unidades(df_corrigido)
-        contagem_padronizada = df_padronizado["unidade"].value_counts()
+        contagem_padronizada = _contar_unidades(df_padronizado["unidade"])
 
         df_final, mudancas = aplicar_heuristicas(df_padronizado)
-        contagem_final = df_final["unidade"].value_counts()
+        contagem_final = _contar_unidades(df_final["unidade"])
 
         exportar_dataframe(df_final)
         gerar_resumos(contagem_inicial, contagem_padronizada, contagem_final, removidas, mudancas)
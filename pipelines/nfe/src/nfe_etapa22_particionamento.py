@@ -19,22 +19,37 @@ Benefícios:
 3. Rastreabilidade: ID é determinístico e reproduzível
 4. Performance: hash de 16 caracteres é rápido e compacto
 
+O algoritmo pode ser trocado por BLAKE2b via ``ETAPA22_HASH_ID=blake2b``
+(mais rápido), ao custo de IDs diferentes dos já exportados. Em bases grandes
+o hash pode rodar em processos paralelos (opcional: ``ETAPA22_PROCESSOS_HASH``,
+padrão 1; 0 = um por CPU) e as tabelas auxiliares são gravadas em threads (``ETAPA22_THREADS_ESCRITA``).
+
 Tratamento de colisões:
 - Se houver duplicatas (raro), adiciona sufixo _1, _2, etc.
+
+Com ``QV_FMT=parquet`` as tabelas são gravadas em Parquet (zstd) em vez de CSV.
 """
 
 from __future__ import annotations
 
 import hashlib
 import io
-import zipfile
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
+from leitura_csv import ler_csv_arrow, ler_csv_zip_arrow, ler_parquet_como_csv
+from nfe_etapa06_otimizacao_memoria import reduzir_tipos
 from paths import DATA_DIR, PROJECT_ROOT
 
+INPUT_PARQUET = DATA_DIR / "processed" / "df_etapa21_unidades_padronizadas.parquet"
+# Formato anterior da Etapa 21, ainda aceito quando o Parquet não existe
 INPUT_ZIP = DATA_DIR / "processed" / "df_etapa21_unidades_padronizadas.zip"
 QLIKVIEW_DIR = PROJECT_ROOT / "QlikView"
 CENTRAL_CSV = QLIKVIEW_DIR / "df_central.csv"
@@ -57,9 +72,43 @@ TABELAS_A_CRIAR: Dict[str, List[str]] = {
     "df_eans.csv": ["EAN_1", "EAN_2", "EAN_3"],
 }
 
+# Grafias de município corrigidas no df_central (errada -> correta)
+CORRECOES_MUNICIPIO: Dict[str, str] = {
+    "SANTA TERESINHA": "SANTA TEREZINHA",
+}
+
+# Campos-chave que identificam unicamente um item de NFe (ordem faz parte do hash)
+COLUNAS_HASH_ID: Tuple[str, ...] = ("chave_codigo", "id_descricao", "descricao_produto", "codigo_ean")
+TAMANHO_ID = 24
+
+# "md5" preserva os IDs já publicados no QlikView. "blake2b" (hashlib) é ~2x mais
+# rápido com o mesmo tamanho de ID, mas gera IDs diferentes: usar só em bases novas.
+ALGORITMO_HASH_ID = os.environ.get("ETAPA22_HASH_ID", "md5").strip().lower()
+# Processos usados no hash dos IDs (1 = sem paralelismo, padrão; 0 = um por CPU).
+# Opcional: cada processo filho reimporta pandas/pyarrow (spawn no Windows) e
+# recebe/devolve as chaves por pickle, o que pode anular o ganho do hash em paralelo
+PROCESSOS_HASH_ID = int(os.environ.get("ETAPA22_PROCESSOS_HASH", "1") or 0)
+MIN_LINHAS_HASH_PARALELO = 500_000
+# Threads para gravar as tabelas auxiliares (0 = uma por tabela; 1 = sequencial)
+THREADS_ESCRITA = int(os.environ.get("ETAPA22_THREADS_ESCRITA", "0") or 0)
+# A chave da NFe (44 dígitos) seria inferida como float pelo Arrow
+TIPOS_LEITURA: Dict[str, pa.DataType] = {"chave_codigo": pa.string()}
+# Linhas por bloco ao varrer os CSVs já publicados no QlikView
+TAMANHO_BLOCO_LEITURA = 200_000
+# Formato das tabelas em QlikView/: "csv" (padrão, lido pelos painéis) ou
+# "parquet" (zstd, colunar e bem menor; exige consumidor que leia Parquet)
+FORMATO_QLIKVIEW = os.environ.get("QV_FMT", "csv").strip().lower()
+
+
+def _diet(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduz os tipos logo após a leitura (inteiros menores, texto repetitivo
+    como ``category``) sem alterar o texto dos valores usados nos IDs e CSVs."""
+    reduzir_tipos(df)
+    return df
+
 
 def carregar_dataframe() -> pd.DataFrame:
-    if not INPUT_ZIP.exists():
+    if not INPUT_PARQUET.exists() and not INPUT_ZIP.exists():
         raise FileNotFoundError(
             "Arquivo da Etapa 21 não encontrado. Execute a etapa anterior primeiro."
         )
@@ -68,15 +117,14 @@ def carregar_dataframe() -> pd.DataFrame:
     print("CARREGANDO DADOS DA ETAPA 21 PARA PARTICIONAMENTO")
     print("=" * 80)
 
-    with zipfile.ZipFile(INPUT_ZIP, "r") as zf:
-        csv_name = next((n for n in zf.namelist() if n.lower().endswith(".csv")), None)
-        if not csv_name:
-            raise ValueError("Nenhum CSV encontrado dentro do arquivo da Etapa 21.")
-        with zf.open(csv_name) as csv_file:
-            df = pd.read_csv(csv_file, sep=";", low_memory=False)
+    if INPUT_PARQUET.exists():
+        df = ler_parquet_como_csv(INPUT_PARQUET)
+    else:
+        # Parser Arrow (multithread); ZIP sem compressão é lido via mmap
+        df = ler_csv_zip_arrow(INPUT_ZIP, TIPOS_LEITURA)
 
     print(f"[OK] Registros carregados: {len(df):,}")
-    return df
+    return _diet(df)
 
 
 def limpar_duplicatas_chave_codigo(df: pd.DataFrame) -> pd.DataFrame:
@@ -136,6 +184,58 @@ def limpar_duplicatas_chave_codigo(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
 
+def _validar_algoritmo(algoritmo: str) -> None:
+    if algoritmo not in ("md5", "blake2b"):
+        raise ValueError(
+            f"Algoritmo de hash '{algoritmo}' não suportado. Use 'md5' ou 'blake2b' em ETAPA22_HASH_ID."
+        )
+
+
+def _hash_lote(chaves: List[str], algoritmo: str) -> List[str]:
+    """Gera os IDs (``TAMANHO_ID`` caracteres hex) de um lote de chaves.
+
+    Função de módulo para poder ser enviada a processos filhos.
+    """
+    if algoritmo == "md5":
+        md5 = hashlib.md5
+        return [md5(chave.encode("utf-8")).hexdigest()[:TAMANHO_ID] for chave in chaves]
+    blake2b = hashlib.blake2b
+    tamanho = TAMANHO_ID // 2
+    return [blake2b(chave.encode("utf-8"), digest_size=tamanho).hexdigest() for chave in chaves]
+
+
+def _gerar_ids(chaves: List[str], algoritmo: str) -> List[str]:
+    """Aplica ``_hash_lote`` em paralelo (processos) quando o volume compensa.
+
+    Threads não ajudam: o hashlib só libera o GIL para entradas >= 2 KiB e as
+    chaves têm ~100 bytes.
+    """
+    _validar_algoritmo(algoritmo)
+    processos = PROCESSOS_HASH_ID or (os.cpu_count() or 1)
+    if processos <= 1 or len(chaves) < MIN_LINHAS_HASH_PARALELO:
+        return _hash_lote(chaves, algoritmo)
+
+    tamanho_lote = -(-len(chaves) // (processos * 4))
+    lotes = [chaves[i:i + tamanho_lote] for i in range(0, len(chaves), tamanho_lote)]
+    print(f"[INFO] Hash em paralelo: {len(lotes)} lotes em {processos} processos")
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        return [id_ for ids in executor.map(_hash_lote, lotes, repeat(algoritmo)) for id_ in ids]
+
+
+def _montar_chaves_hash(df: pd.DataFrame) -> pd.Series:
+    """Concatena os campos-chave em ``chave|id_desc|descricao|ean`` de forma vetorizada.
+
+    Reproduz ``str(row.get(coluna, ''))`` da versão linha a linha: valores
+    nulos viram ``'nan'``/``'None'`` e colunas ausentes viram string vazia,
+    mantendo os IDs idênticos aos de cargas anteriores.
+    """
+    partes = [
+        df[coluna].astype(str) if coluna in df.columns else pd.Series("", index=df.index)
+        for coluna in COLUNAS_HASH_ID
+    ]
+    return partes[0].str.cat(partes[1:], sep="|")
+
+
 def preparar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Prepara DataFrame para particionamento.
     
@@ -149,65 +249,261 @@ def preparar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     1. Registros idênticos sempre terão o mesmo ID
     2. IDs são estáveis entre execuções incrementais
     3. Não há conflitos quando a base cresce mensalmente
-    """
-    df_proc = df.copy()
-    df_proc.reset_index(drop=True, inplace=True)
     
-    # Gerar ID único baseado em hash MD5
-    def gerar_id_hash(row):
-        # Campos-chave que identificam unicamente um item de NFe
-        chave = str(row.get('chave_codigo', ''))
-        id_desc = str(row.get('id_descricao', ''))
-        desc_prod = str(row.get('descricao_produto', ''))
-        ean = str(row.get('codigo_ean', ''))
-        
-        # Criar string única combinando os campos
-        string_unica = f"{chave}|{id_desc}|{desc_prod}|{ean}"
-        
-        # Gerar hash MD5 e pegar os primeiros 24 caracteres
-        hash_completo = hashlib.md5(string_unica.encode('utf-8')).hexdigest()
-        return hash_completo[:24]
+    O DataFrame recebido é alterado no lugar (sem cópia da base inteira);
+    o chamador não deve reutilizar a versão anterior.
+    """
+    df.reset_index(drop=True, inplace=True)
     
-    print("[INFO] Gerando IDs únicos baseados em hash MD5...")
-    df_proc["id"] = df_proc.apply(gerar_id_hash, axis=1)
+    print(f"[INFO] Gerando IDs únicos baseados em hash {ALGORITMO_HASH_ID.upper()}...")
+    chaves = _montar_chaves_hash(df)
+    if "chave_codigo" in df.columns:
+        # limpar_duplicatas_chave_codigo já deixou (chave_codigo, id_descricao)
+        # únicos: as chaves compostas são distintas e vão direto para o hash
+        ids = np.asarray(_gerar_ids(chaves.tolist(), ALGORITMO_HASH_ID), dtype=object)
+    else:
+        # Sem a limpeza, chaves repetidas são hasheadas uma única vez e o ID
+        # volta às linhas pelo código
+        codigos, chaves_unicas = pd.factorize(chaves)
+        ids_unicos = np.asarray(_gerar_ids(chaves_unicas.tolist(), ALGORITMO_HASH_ID), dtype=object)
+        ids = ids_unicos[codigos]
+    del chaves
+    df["id"] = ids
     
-    # Verificar se há duplicatas de ID
-    duplicatas = df_proc['id'].duplicated().sum()
+    # Verificar se há duplicatas de ID: só possíveis com chaves repetidas ou
+    # colisão de hash entre chaves distintas
+    duplicatas = 0
+    if not pd.Index(ids).is_unique:
+        codigos_id, ids_distintos = pd.factorize(ids)
+        duplicatas = len(df) - len(ids_distintos)
     if duplicatas > 0:
         print(f"[AVISO] Encontradas {duplicatas} duplicatas de ID hash - resolvendo com sufixo...")
-        # Adicionar sufixo numérico para resolver duplicatas
-        df_proc['_counter'] = df_proc.groupby('id').cumcount()
-        mask_duplicado = df_proc['_counter'] > 0
-        df_proc.loc[mask_duplicado, 'id'] = df_proc.loc[mask_duplicado, 'id'] + '_' + df_proc.loc[mask_duplicado, '_counter'].astype(str)
-        df_proc.drop(columns=['_counter'], inplace=True)
-        print(f"[OK] Duplicatas resolvidas - {len(df_proc):,} IDs únicos")
+        # Sufixo _1, _2... pela ordem de ocorrência (cumcount sobre códigos inteiros)
+        contador = pd.Series(codigos_id).groupby(codigos_id).cumcount().to_numpy()
+        repetidos = np.flatnonzero(contador > 0)
+        ids = df["id"].to_numpy(dtype=object, copy=True)
+        ids[repetidos] = [f"{ids[i]}_{contador[i]}" for i in repetidos]
+        df["id"] = ids
+        print(f"[OK] Duplicatas resolvidas - {len(df):,} IDs únicos")
     else:
-        print(f"[OK] {len(df_proc):,} IDs únicos gerados com sucesso")
+        print(f"[OK] {len(df):,} IDs únicos gerados com sucesso")
 
     for coluna in ["valor_produtos_ajustado", "valor_unitario_ajustado"]:
-        if coluna in df_proc.columns:
-            df_proc[coluna] = pd.to_numeric(df_proc[coluna], errors="coerce")
+        if coluna in df.columns:
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+
+    return df
+
+
+def _chaves_deduplicacao(df: pd.DataFrame) -> Optional[List[str]]:
+    """Colunas que identificam um item de NFe (None = todas as colunas)."""
+    if "chave_codigo" not in df.columns:
+        return None
+    chaves = ["chave_codigo"]
+    if "id_descricao" in df.columns:
+        chaves.append("id_descricao")
+    return chaves
+
+
+def _alinhar_tipos(df: pd.DataFrame, referencia: pd.DataFrame) -> pd.DataFrame:
+    """``df`` com tipos alinhados a ``referencia`` para comparar e hashear linhas.
+
+    Blocos lidos do CSV podem inferir tipos diferentes do lote novo (int em um,
+    float em outro): colunas numéricas em ``referencia`` viram float64 e as
+    demais viram texto, para que valores iguais gerem o mesmo hash.
+    """
+    normalizado = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        tipo_ref = referencia[coluna].dtype
+        if pd.api.types.is_numeric_dtype(tipo_ref) and not pd.api.types.is_bool_dtype(tipo_ref):
+            normalizado[coluna] = pd.to_numeric(serie, errors="coerce").astype("float64")
+        else:
+            normalizado[coluna] = serie.astype(str).where(serie.notna(), None)
+    return pd.DataFrame(normalizado)
+
+
+def _hash_linhas(df: pd.DataFrame, referencia: pd.DataFrame) -> np.ndarray:
+    """Impressão digital (uint64) de cada linha, com tipos alinhados a ``referencia``."""
+    return pd.util.hash_pandas_object(_alinhar_tipos(df, referencia), index=False).to_numpy()
+
+
+def _duplicadas_exatas(df: pd.DataFrame, hashes: np.ndarray) -> np.ndarray:
+    """Máscara igual a ``df.duplicated(keep="first")`` usando ``hashes`` como filtro.
+
+    Só as linhas cujo hash se repete são comparadas de fato (linhas iguais têm
+    o mesmo hash), então uma colisão entre linhas distintas não descarta nenhuma.
+    """
+    candidatas = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    duplicadas = np.zeros(len(df), dtype=bool)
+    if candidatas.any():
+        duplicadas[candidatas] = df[candidatas].duplicated().to_numpy()
+    return duplicadas
+
 
-    return df_proc
+def _tipos_texto(referencia: pd.DataFrame) -> Dict[str, type]:
+    """``dtype`` do ``read_csv`` que mantém como texto as colunas não numéricas em ``referencia``.
+
+    Sem isso, cada bloco infere seus tipos: um bloco só com EANs numéricos (ex.
+    "7891234567890" e vazios) viraria float64 e o hash veria "7891234567890.0",
+    enquanto o lote novo tem "7891234567890".
+    """
+    return {
+        coluna: str
+        for coluna, tipo in referencia.dtypes.items()
+        if not pd.api.types.is_numeric_dtype(tipo) or pd.api.types.is_bool_dtype(tipo)
+    }
+
+
+def _deduplicar_por_hash(
+    df: pd.DataFrame, colunas: Optional[List[str]] = None, referencia: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """Equivale a ``drop_duplicates(subset=colunas, keep="first")`` com um hash por linha.
+
+    Uma única passada de ``hash_pandas_object`` substitui a fatoração coluna a
+    coluna do ``drop_duplicates``; as linhas com hash repetido são confirmadas
+    por comparação (``_duplicadas_exatas``). Com ``referencia``, os tipos são
+    alinhados como em ``_alinhar_tipos`` (linhas vindas de CSV e do lote novo).
+    """
+    colunas = colunas or list(df.columns)
+    if referencia is None:
+        chaves = df[colunas]
+    else:
+        chaves = _alinhar_tipos(df[colunas], referencia[colunas])
+    hashes = pd.util.hash_pandas_object(chaves, index=False).to_numpy()
+    return df[~_duplicadas_exatas(chaves, hashes)]
+
+
+def _caminho_qlikview(caminho: Path) -> Path:
+    """Ajusta a extensão de uma tabela do QlikView a ``FORMATO_QLIKVIEW``."""
+    if FORMATO_QLIKVIEW not in ("csv", "parquet"):
+        raise ValueError(f"Formato '{FORMATO_QLIKVIEW}' não suportado. Use 'csv' ou 'parquet' em QV_FMT.")
+    return caminho.with_suffix(f".{FORMATO_QLIKVIEW}")
+
+
+def _anexar_parquet(
+    df: pd.DataFrame, caminho: Path, chaves: Optional[List[str]] = None
+) -> Tuple[int, int]:
+    """Versão Parquet de ``_anexar_sem_duplicatas`` (concat + dedupe + reescrita)."""
+    if not caminho.exists():
+        df.to_parquet(caminho, compression="zstd", index=False)
+        return 0, len(df)
+
+    df_unido = pd.concat([pd.read_parquet(caminho), df], ignore_index=True)
+    registros_antigos = len(df_unido) - len(df)
+    df_unido = _deduplicar_por_hash(df_unido, chaves)
+    df_unido.to_parquet(caminho, compression="zstd", index=False)
+    return registros_antigos, len(df_unido) - registros_antigos
+
+
+def _anexar_sem_duplicatas(
+    df: pd.DataFrame, caminho: Path, chaves: Optional[List[str]] = None
+) -> Tuple[int, int]:
+    """Acrescenta a ``caminho`` apenas as linhas de ``df`` que ainda não existem.
+
+    Equivale a concat + ``drop_duplicates(subset=chaves)`` + reescrita, mas,
+    quando o arquivo existente já está limpo e tem as mesmas colunas, as
+    linhas antigas não são reescritas: as novas vão ao final (modo "a").
+
+    O arquivo antigo é lido em blocos de ``TAMANHO_BLOCO_LEITURA`` linhas, só
+    nas colunas-chave (ou todas, sem ``chaves``), guardando um hash por linha:
+    a memória fica em O(bloco) + 8 bytes por registro antigo.
+
+    Contra a base antiga a comparação é só por hash (as linhas antigas não são
+    guardadas): uma linha nova distinta é descartada apenas se colidir nos 64
+    bits com alguma antiga, probabilidade de ~n_antigas * n_novas / 2**64
+    (~5e-6 para 10 milhões x 10 milhões). Dentro do lote novo e na reescrita a
+    igualdade é confirmada (``_duplicadas_exatas``).
+
+    Retorna (registros já existentes, saldo de registros acrescentados).
+    """
+    if caminho.suffix == ".parquet":
+        return _anexar_parquet(df, caminho, chaves)
+
+    if not caminho.exists():
+        df.to_csv(caminho, sep=";", index=False, encoding="utf-8")
+        return 0, len(df)
+
+    colunas_antigas = list(pd.read_csv(caminho, sep=";", nrows=0).columns)
+    if colunas_antigas == list(df.columns):
+        colunas_chave = chaves or colunas_antigas
+        referencia = df[colunas_chave]
+        blocos = pd.read_csv(
+            caminho,
+            sep=";",
+            usecols=colunas_chave,
+            dtype=_tipos_texto(referencia),
+            chunksize=TAMANHO_BLOCO_LEITURA,
+            low_memory=False,
+        )
+        hashes_antigos = pd.Index(
+            np.concatenate(
+                [np.empty(0, dtype=np.uint64)]
+                + [_hash_linhas(bloco[colunas_chave], referencia) for bloco in blocos]
+            )
+        )
+        registros_antigos = len(hashes_antigos)
+
+        if hashes_antigos.is_unique:
+            chaves_novas = _alinhar_tipos(referencia, referencia)
+            hashes_novos = pd.util.hash_pandas_object(chaves_novas, index=False).to_numpy()
+            ja_existe = pd.Index(hashes_novos).isin(hashes_antigos)
+            ja_existe |= _duplicadas_exatas(chaves_novas, hashes_novos)
+            novos = df[~ja_existe]
+            novos.to_csv(caminho, sep=";", index=False, header=False, mode="a", encoding="utf-8")
+            return registros_antigos, len(novos)
+
+    print(f"[AVISO] {caminho.name}: base anterior com duplicatas ou colunas diferentes - reescrevendo")
+    df_antigo = pd.read_csv(caminho, sep=";", dtype=_tipos_texto(df), low_memory=False)
+    df_unido = pd.concat([df_antigo, df], ignore_index=True)
+    del df_antigo
+    registros_antigos = len(df_unido) - len(df)
+    if list(df_unido.columns) == list(df.columns):
+        df_unido = _deduplicar_por_hash(df_unido, chaves, referencia=df)
+    else:
+        df_unido.drop_duplicates(subset=chaves, inplace=True)
+    df_unido.to_csv(caminho, sep=";", index=False, encoding="utf-8")
+    return registros_antigos, len(df_unido) - registros_antigos
+
+
+def _nada_a_anexar(df: pd.DataFrame, caminho: Path) -> bool:
+    """True quando o lote está vazio e o arquivo já existe: evita reler a base anterior."""
+    if df.empty and caminho.exists():
+        print(f"[INFO] {caminho.name}: nenhum registro novo - arquivo mantido sem releitura")
+        return True
+    return False
 
 
 def salvar_qlikview(df: pd.DataFrame, destino: Path, nome_arquivo: str) -> None:
     destino.mkdir(parents=True, exist_ok=True)
-    caminho = destino / nome_arquivo
-
-    if caminho.exists():
-        df_antigo = pd.read_csv(caminho, sep=";", low_memory=False)
-        df = pd.concat([df_antigo, df], ignore_index=True)
-        df.drop_duplicates(inplace=True)
+    caminho = _caminho_qlikview(destino / nome_arquivo)
+    if _nada_a_anexar(df, caminho):
+        return
 
-    df.to_csv(caminho, sep=";", index=False, encoding="utf-8")
+    _anexar_sem_duplicatas(df, caminho)
     print(f"[OK] Arquivo atualizado em {caminho.relative_to(PROJECT_ROOT)}")
 
 
 def extrair_tabelas(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
-    df_central = df.copy()
-    estatisticas = {}
+    """Salva as tabelas auxiliares e retorna o central.
 
+    As colunas extraídas são removidas de ``df`` no próprio objeto (sem cópia
+    do frame inteiro); o retorno é o mesmo objeto.
+    """
+    df_central = df
+    estatisticas = {}
+    # Com "id" único (garantido por preparar_dataframe) nenhuma linha de subset
+    # pode se repetir: a deduplicação por tabela só é necessária no caso contrário
+    ids_unicos = df_central["id"].is_unique
+
+    # Uma única passada de notna() para todas as colunas auxiliares; cada tabela
+    # copia só as linhas com algum valor (equivale a dropna(how="all"))
+    colunas_auxiliares = [
+        col for colunas in TABELAS_A_CRIAR.values() for col in colunas if col in df_central.columns
+    ]
+    preenchidas = df_central[list(dict.fromkeys(colunas_auxiliares))].notna()
+
+    tabelas = []
     for nome_arquivo, colunas in TABELAS_A_CRIAR.items():
         colunas_existentes = [col for col in colunas if col in df_central.columns]
         if not colunas_existentes:
@@ -215,36 +511,67 @@ def extrair_tabelas(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
             continue
 
         print(f"Processando {nome_arquivo}...")
-        subset = df_central[["id"] + colunas_existentes].copy()
-        subset.dropna(how="all", subset=colunas_existentes, inplace=True)
-        subset.drop_duplicates(inplace=True)
+        com_valor = preenchidas[colunas_existentes].to_numpy().any(axis=1)
+        subset = df_central.loc[com_valor, ["id"] + colunas_existentes]
+        if not ids_unicos:
+            subset = _deduplicar_por_hash(subset)
 
-        salvar_qlikview(subset, QLIKVIEW_DIR, nome_arquivo)
+        tabelas.append((nome_arquivo, subset))
         estatisticas[nome_arquivo] = len(subset)
 
         df_central.drop(columns=colunas_existentes, inplace=True)
 
+    # Cada tabela vai para um arquivo próprio: as gravações (leitura do arquivo
+    # anterior + escrita, em código C que libera o GIL) rodam em paralelo
+    threads = min(THREADS_ESCRITA or len(tabelas), len(tabelas))
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda tabela: salvar_qlikview(tabela[1], QLIKVIEW_DIR, tabela[0]), tabelas))
+    else:
+        for nome_arquivo, subset in tabelas:
+            salvar_qlikview(subset, QLIKVIEW_DIR, nome_arquivo)
+
     return df_central, estatisticas
 
 
+def _corrigir_categorias(serie: pd.Series, correcoes: Dict[str, str]) -> pd.Series:
+    """Aplica ``correcoes`` só no dicionário de categorias (sem varrer as linhas).
+
+    Quando a grafia corrigida já existe como categoria, as duas são fundidas
+    remapeando os códigos inteiros.
+    """
+    categorias = serie.cat.categories
+    if not categorias.isin(list(correcoes)).any():
+        return serie
+    corrigidas = categorias.map(lambda categoria: correcoes.get(categoria, categoria))
+    if corrigidas.is_unique:
+        return serie.cat.rename_categories(corrigidas)
+    unicas = corrigidas.unique()
+    remapa = np.append(unicas.get_indexer(corrigidas), -1)
+    codigos = remapa[serie.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codigos, unicas), index=serie.index, name=serie.name)
+
+
 def ajustar_municipio(df: pd.DataFrame) -> pd.DataFrame:
     if "municipio" in df.columns:
-        df.loc[df["municipio"] == "SANTA TERESINHA", "municipio"] = "SANTA TEREZINHA"
+        municipio = df["municipio"]
+        # Coluna pode vir como category (_diet): corrige só as categorias
+        if isinstance(municipio.dtype, pd.CategoricalDtype):
+            df["municipio"] = _corrigir_categorias(municipio, CORRECOES_MUNICIPIO)
+        else:
+            df["municipio"] = municipio.replace(CORRECOES_MUNICIPIO)
     return df
 
 
 def exportar_central(df: pd.DataFrame) -> None:
-    """Export df_central as CSV in QlikView/; concatenate + dedupe if exists."""
+    """Export df_central in QlikView/ (CSV or Parquet, see QV_FMT); concatenate + dedupe if exists."""
     print("\n" + "=" * 80)
     print("EXPORTANDO DF_CENTRAL")
     print("=" * 80)
     
     # Verificação de duplicatas ANTES da concatenação
-    if 'chave_codigo' in df.columns:
-        chaves = ['chave_codigo']
-        if 'id_descricao' in df.columns:
-            chaves.append('id_descricao')
-        
+    chaves = _chaves_deduplicacao(df)
+    if chaves:
         duplicatas_pre = df.duplicated(subset=chaves, keep='first').sum()
         if duplicatas_pre > 0:
             print(f"[AVISO] Encontradas {duplicatas_pre:,} duplicatas nos NOVOS dados - removendo...")
@@ -254,62 +581,20 @@ def exportar_central(df: pd.DataFrame) -> None:
             print(f"[OK] Novos dados validados: {len(df):,} registros unicos (sem duplicatas)")
     
     QLIKVIEW_DIR.mkdir(parents=True, exist_ok=True)
-    caminho = CENTRAL_CSV
+    caminho = _caminho_qlikview(CENTRAL_CSV)
     
-    if caminho.exists():
-        print(f"\n[INFO] Arquivo existente detectado - carregando base anterior...")
-        df_antigo = pd.read_csv(caminho, sep=";", low_memory=False)
-        registros_antigos = len(df_antigo)
+    if not caminho.exists():
+        print(f"[INFO] Primeira exportacao - {len(df):,} registros")
+        _anexar_sem_duplicatas(df, caminho, chaves)
+    elif not _nada_a_anexar(df, caminho):
+        print(f"\n[INFO] Arquivo existente detectado - anexando apenas registros novos...")
+        registros_antigos, incremento_real = _anexar_sem_duplicatas(df, caminho, chaves)
         print(f"[INFO] Base anterior: {registros_antigos:,} registros")
-        
-        # Verificar duplicatas na base ANTIGA antes de concatenar
-        if 'chave_codigo' in df_antigo.columns:
-            chaves = ['chave_codigo']
-            if 'id_descricao' in df_antigo.columns:
-                chaves.append('id_descricao')
-            
-            duplicatas_antigas = df_antigo.duplicated(subset=chaves, keep='first').sum()
-            if duplicatas_antigas > 0:
-                print(f"[AVISO] Base anterior com {duplicatas_antigas:,} duplicatas - limpando...")
-                df_antigo = df_antigo.drop_duplicates(subset=chaves, keep='first')
-                print(f"[OK] Base anterior limpa: {len(df_antigo):,} registros unicos")
-        
-        # Concatenar
-        print(f"\n[INFO] Concatenando base anterior + novos dados...")
-        registros_novos_antes = len(df)
-        df = pd.concat([df_antigo, df], ignore_index=True)
-        registros_pos_concat = len(df)
-        print(f"[INFO] Total apos concatenacao: {registros_pos_concat:,} registros")
-        
-        # Limpeza CRÍTICA: remover duplicatas entre base antiga e novos dados
-        if 'chave_codigo' in df.columns:
-            chaves = ['chave_codigo']
-            if 'id_descricao' in df.columns:
-                chaves.append('id_descricao')
-            
-            duplicatas_pos = df.duplicated(subset=chaves, keep='first').sum()
-            if duplicatas_pos > 0:
-                print(f"[AVISO] Encontradas {duplicatas_pos:,} duplicatas APOS concatenacao - removendo...")
-                df = df.drop_duplicates(subset=chaves, keep='first')
-                registros_final = len(df)
-                removidas = registros_pos_concat - registros_final
-                print(f"[OK] {removidas:,} duplicatas cruzadas removidas")
-                print(f"[OK] Total final: {registros_final:,} registros unicos")
-            else:
-                print(f"[OK] Nenhuma duplicata entre bases - {len(df):,} registros unicos")
-        else:
-            df.drop_duplicates(inplace=True)
-            print(f"[OK] Deduplicacao generica aplicada - {len(df):,} registros")
-        
-        # Calcular incremento real
-        incremento_real = len(df) - registros_antigos
+        print(f"[OK] Total final: {registros_antigos + incremento_real:,} registros unicos")
         print(f"\n[RESUMO] Incremento liquido: +{incremento_real:,} novos registros unicos")
-    else:
-        print(f"[INFO] Primeira exportacao - {len(df):,} registros")
 
-    df.to_csv(caminho, sep=";", index=False, encoding="utf-8")
     tamanho_mb = caminho.stat().st_size / (1024 * 1024)
-    print(f"[OK] df_central.csv salvo em QlikView ({tamanho_mb:.2f} MB)")
+    print(f"[OK] {caminho.name} salvo em QlikView ({tamanho_mb:.2f} MB)")
     print("=" * 80)
 
 
@@ -318,17 +603,15 @@ def mover_nfe_vencimento() -> None:
         print("[AVISO] nfe_vencimento.csv não encontrado em data/external. Pulando cópia.")
         return
 
-    df_venc = pd.read_csv(VENCIMENTO_ORIGEM, sep=";", low_memory=False)
+    df_venc = _diet(ler_csv_arrow(VENCIMENTO_ORIGEM, TIPOS_LEITURA))
     df_venc.drop_duplicates(inplace=True)
 
-    if VENCIMENTO_DESTINO.exists():
-        df_antigo = pd.read_csv(VENCIMENTO_DESTINO, sep=";", low_memory=False)
-        df_venc = pd.concat([df_antigo, df_venc], ignore_index=True)
-        df_venc.drop_duplicates(inplace=True)
-
     QLIKVIEW_DIR.mkdir(parents=True, exist_ok=True)
-    df_venc.to_csv(VENCIMENTO_DESTINO, sep=";", index=False, encoding="utf-8")
-    print("[OK] nfe_vencimento.csv disponível na pasta QlikView")
+    destino = _caminho_qlikview(VENCIMENTO_DESTINO)
+    if _nada_a_anexar(df_venc, destino):
+        return
+    _anexar_sem_duplicatas(df_venc, destino)
+    print(f"[OK] {destino.name} disponível na pasta QlikView")
 
 
 def main() -> bool:
@@ -336,13 +619,15 @@ def main() -> bool:
         df = carregar_dataframe()
         
         # PASSO 1: Limpar duplicatas ANTES de qualquer processamento
-        df_limpo = limpar_duplicatas_chave_codigo(df)
+        # (reatribuir df libera a base original assim que não é mais usada)
+        df = limpar_duplicatas_chave_codigo(df)
         
-        # PASSO 2: Preparar DataFrame (gerar IDs)
-        df_preparado = preparar_dataframe(df_limpo)
+        # PASSO 2: Preparar DataFrame (gerar IDs, no lugar)
+        df = preparar_dataframe(df)
         
         # PASSO 3: Extrair tabelas auxiliares
-        df_central, estatisticas = extrair_tabelas(df_preparado)
+        df_central, estatisticas = extrair_tabelas(df)
+        del df
         
         # PASSO 4: Ajustes finais
         df_central = ajustar_municipio(df_central)
@@ -354,7 +639,7 @@ def main() -> bool:
         print("\nResumo do particionamento:")
         for nome, linhas in estatisticas.items():
             print(f" - {nome}: {linhas:,} linhas")
-        print(f" - df_central.csv: {len(df_central):,} linhas")
+        print(f" - {_caminho_qlikview(CENTRAL_CSV).name}: {len(df_central):,} linhas")
         print("\n[SUCESSO] Etapa 22 concluida!")
         return True
     except Exception as exc:  # pragma: no cover
@@ -1,5 +1,7 @@
 """Common path helpers for the NFe pipeline."""
+import os
 from pathlib import Path
+from typing import Optional, Union
 
 PIPELINE_ROOT = Path(__file__).resolve().parent.parent
 PROJECT_ROOT = PIPELINE_ROOT.parent.parent
@@ -9,3 +11,31 @@ SUPPORT_DIR = PIPELINE_ROOT / "support"
 SRC_DIR = PIPELINE_ROOT / "src"
 ANVISA_SRC_DIR = PIPELINE_ROOT.parent / "anvisa_base" / "src"
 ANVISA_MODULES_DIR = ANVISA_SRC_DIR / "modules"
+
+
+def encontrar_mais_recente(
+    diretorio: Union[str, Path], prefixo: str, sufixo: str
+) -> Optional[str]:
+    """Arquivo mais recente (mtime) de ``diretorio`` com o prefixo/sufixo dados.
+
+    Uma única listagem com ``os.scandir``, que reaproveita o stat de cada
+    entrada, no lugar de ``glob`` + ``max(key=os.path.getmtime)``.
+    Retorna None se nada casar ou o diretório não existir.
+    """
+    mais_recente = None
+    maior_mtime = -1.0
+    try:
+        with os.scandir(diretorio) as entradas:
+            for entrada in entradas:
+                if (
+                    entrada.name.startswith(prefixo)
+                    and entrada.name.endswith(sufixo)
+                    and entrada.is_file()
+                ):
+                    mtime = entrada.stat().st_mtime
+                    if mtime > maior_mtime:
+                        maior_mtime = mtime
+                        mais_recente = entrada.path
+    except FileNotFoundError:
+        return None
+    return mais_recente
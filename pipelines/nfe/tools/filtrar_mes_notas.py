@@ -7,9 +7,27 @@ Exemplo de uso:
 from __future__ import annotations
 
 import argparse
+import csv
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+from pipelines.nfe.src.leitura_csv import NULOS_CSV, TAMANHO_BLOCO
+
+
+def _filtro_mes(datas: pa.ChunkedArray, ano: int, mes: int) -> np.ndarray:
+    """Máscara das datas no mês/ano, convertendo cada texto distinto uma só vez.
+
+    O ``to_datetime`` infere o formato pelo primeiro valor não nulo, que o
+    factorize mantém na primeira posição.
+    """
+    codigos, unicas = pd.factorize(datas.to_numpy(zero_copy_only=False))
+    convertidas = pd.to_datetime(pd.Series(unicas, dtype=object), errors="coerce")
+    no_mes = ((convertidas.dt.year == ano) & (convertidas.dt.month == mes)).to_numpy()
+    return np.append(no_mes, False)[codigos]
 
 
 def filtrar_mes(
@@ -18,10 +36,15 @@ def filtrar_mes(
     ano: int,
     mes: int,
     *,
-    chunksize: int = 250_000,
+    tamanho_bloco: int = TAMANHO_BLOCO,
     encoding: str = "latin1",
 ) -> Path:
-    """Filtra o CSV de origem mantendo apenas registros do mês/ano informado."""
+    """Filtra o CSV de origem mantendo apenas registros do mês/ano informado.
+
+    O CSV é lido em blocos de ``tamanho_bloco`` bytes pelo leitor em streaming
+    do Arrow, com todas as colunas como texto e os mesmos nulos do
+    ``read_csv(dtype=str)``; só as linhas selecionadas passam pelo pandas.
+    """
     if not caminho_fonte.exists():
         raise FileNotFoundError(f"Arquivo fonte não encontrado: {caminho_fonte}")
 
@@ -30,22 +53,27 @@ def filtrar_mes(
     if destino_csv.exists():
         destino_csv.unlink()
 
+    with open(caminho_fonte, "r", encoding=encoding, newline="") as arquivo:
+        colunas = next(csv.reader(arquivo, delimiter=";"))
+
     header_escrito = False
     total_registros = 0
 
-    for chunk in pd.read_csv(
+    leitor = pv.open_csv(
         caminho_fonte,
-        sep=";",
-        dtype=str,
-        chunksize=chunksize,
-        low_memory=False,
-        encoding=encoding,
-    ):
-        datas = pd.to_datetime(chunk["data_emissao"], errors="coerce")
-        filtro = (datas.dt.year == ano) & (datas.dt.month == mes)
-        selecionados = chunk.loc[filtro].copy()
-        if selecionados.empty:
+        read_options=pv.ReadOptions(encoding=encoding, block_size=tamanho_bloco),
+        parse_options=pv.ParseOptions(delimiter=";", newlines_in_values=True),
+        convert_options=pv.ConvertOptions(
+            column_types=dict.fromkeys(colunas, pa.string()),
+            null_values=list(NULOS_CSV),
+            strings_can_be_null=True,
+        ),
+    )
+    for lote in leitor:
+        filtro = _filtro_mes(lote.column("data_emissao"), ano, mes)
+        if not filtro.any():
             continue
+        selecionados = lote.filter(pa.array(filtro)).to_pandas()
 
         selecionados.to_csv(
             destino_csv,
@@ -78,13 +106,18 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--ano", type=int, required=True)
     parser.add_argument("--mes", type=int, required=True)
-    parser.add_argument("--chunksize", type=int, default=250_000)
+    parser.add_argument(
+        "--tamanho-bloco",
+        type=int,
+        default=TAMANHO_BLOCO,
+        help="Bytes do CSV lidos por bloco",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    filtrar_mes(args.fonte, args.destino, args.ano, args.mes, chunksize=args.chunksize)
+    filtrar_mes(args.fonte, args.destino, args.ano, args.mes, tamanho_bloco=args.tamanho_bloco)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+TESTE DA DEDUPLICAÇÃO DA ETAPA 22
+
+Reanexa o mesmo lote a um CSV do QlikView lido em blocos pequenos e confere
+que nenhuma linha é duplicada, inclusive quando um bloco só tem valores
+numéricos em uma coluna de texto (EAN) e o bloco seguinte tem texto.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+import pandas as pd
+
+import nfe_etapa22_particionamento as etapa22
+
+print("=" * 80)
+print("TESTE DE DEDUPLICACAO - ETAPA 22")
+print("=" * 80)
+
+# Bloco 1 (a, b, c): EANs numéricos e um vazio -> seria lido como float64
+# Bloco 2 (d, e, f): tem "SEM GTIN" -> lido como texto
+lote = pd.DataFrame({
+    "chave_codigo": ["a", "b", "c", "d", "e", "f"],
+    "codigo_ean": ["7891234567890", None, "7891234567892", "7891234567891", "SEM GTIN", "7891234567893"],
+    "quantidade": [1, 2, 3, 4, 5, 6],
+})
+etapa22.TAMANHO_BLOCO_LEITURA = 3
+falhas = 0
+
+with tempfile.TemporaryDirectory() as pasta:
+    caminho = Path(pasta) / "df_teste.csv"
+    casos = [
+        ("primeira carga grava o lote", (0, 6)),
+        ("mesmo lote não é reanexado (com chaves)", (6, 0)),
+    ]
+    resultados = [
+        etapa22._anexar_sem_duplicatas(lote, caminho),
+        etapa22._anexar_sem_duplicatas(lote, caminho, ["chave_codigo", "codigo_ean"]),
+    ]
+    for (descricao, esperado), obtido in zip(casos, resultados):
+        ok = obtido == esperado
+        falhas += not ok
+        print(f"  {'✓' if ok else '✗'} {descricao}: {obtido} (esperado {esperado})")
+
+    ok = etapa22._anexar_sem_duplicatas(lote, caminho) == (6, 0)
+    falhas += not ok
+    print(f"  {'✓' if ok else '✗'} mesmo lote não é reanexado (linha inteira)")
+
+    linhas = len(pd.read_csv(caminho, sep=";"))
+    ok = linhas == len(lote)
+    falhas += not ok
+    print(f"  {'✓' if ok else '✗'} arquivo final com {linhas} linhas (esperado {len(lote)})")
+
+print("\n" + "=" * 80)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Deduplicação da Etapa 22 consistente")
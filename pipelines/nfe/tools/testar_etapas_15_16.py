@@ -5,11 +5,37 @@ TESTE DAS ETAPAS 15 E 16
 Script para testar se as novas etapas estão configuradas corretamente.
 """
 
+import importlib.util
+import os
 import sys
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 BASE_DIR = Path(__file__).resolve().parent
 
+
+@lru_cache(maxsize=None)
+def _listar_pasta(pasta: Path) -> Optional[dict]:
+    """Entradas de ``pasta`` por nome (None se a pasta não existir): uma listagem
+    por pasta serve tanto à verificação da pasta quanto à dos seus arquivos."""
+    try:
+        with os.scandir(pasta) as entradas:
+            return {entrada.name: entrada for entrada in entradas}
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _stat_arquivo(path: Path):
+    """``os.stat_result`` de ``path`` (segue links, como o pathlib) ou None se não existir."""
+    entrada = (_listar_pasta(path.parent) or {}).get(path.name)
+    if entrada is None:
+        return None
+    try:
+        return entrada.stat(follow_symlinks=True)
+    except FileNotFoundError:
+        return None
+
 print("="*80)
 print("TESTE DE CONFIGURACAO - ETAPAS 15 E 16")
 print("="*80)
@@ -23,7 +49,7 @@ pastas = [
 ]
 
 for pasta in pastas:
-    status = "✓" if pasta.exists() else "✗"
+    status = "✓" if _listar_pasta(pasta) is not None else "✗"
     print(f"  {status} {pasta}")
 
 # Verificar arquivos de entrada
@@ -34,8 +60,9 @@ arquivos_entrada = [
 ]
 
 for arquivo in arquivos_entrada:
-    if arquivo.exists():
-        tamanho = arquivo.stat().st_size / (1024 * 1024)
+    stat_arquivo = _stat_arquivo(arquivo)
+    if stat_arquivo is not None:
+        tamanho = stat_arquivo.st_size / (1024 * 1024)
         print(f"  ✓ {arquivo.name} ({tamanho:.2f} MB)")
     else:
         print(f"  ✗ {arquivo.name} (NAO ENCONTRADO)")
@@ -50,8 +77,7 @@ modulos = [
 sys.path.insert(0, str(BASE_DIR))
 
 for nome_modulo, arquivo in modulos:
-    arquivo_path = BASE_DIR / 'src' / arquivo
-    if arquivo_path.exists():
+    if _stat_arquivo(BASE_DIR / 'src' / arquivo) is not None:
         try:
             __import__(nome_modulo)
             print(f"  ✓ {arquivo}")
@@ -69,11 +95,11 @@ dependencias = [
     'tqdm'
 ]
 
+# find_spec só localiza o pacote, sem executá-lo (importar pandas custa segundos)
 for dep in dependencias:
-    try:
-        __import__(dep)
+    if importlib.util.find_spec(dep) is not None:
         print(f"  ✓ {dep}")
-    except ImportError:
+    else:
         print(f"  ✗ {dep} (NAO INSTALADO)")
 
 # Resumo
@@ -82,8 +108,8 @@ print("RESUMO")
 print("="*80)
 
 # Verificar se pode rodar etapa 15
-etapa14_ok = (BASE_DIR / 'data' / 'processed' / 'df_etapa14_final_enriquecido.zip').exists()
-base_ok = (BASE_DIR / 'output' / 'anvisa' / 'baseANVISA.csv').exists()
+etapa14_ok = _stat_arquivo(BASE_DIR / 'data' / 'processed' / 'df_etapa14_final_enriquecido.zip') is not None
+base_ok = _stat_arquivo(BASE_DIR / 'output' / 'anvisa' / 'baseANVISA.csv') is not None
 
 if etapa14_ok and base_ok:
     print("\n✓ PRONTO para executar Etapa 15")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+TESTE DA LEITURA DE CSV PELO ARROW
+
+Confere que ``ler_csv_arrow`` devolve o mesmo DataFrame que ``pd.read_csv``
+(parser C) para os casos que divergiriam: textos nulos do pandas ("None",
+"<NA>", "NA"...), datas ISO, colunas vazias, chave de 44 dígitos e BOM.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+import pandas as pd
+import pyarrow as pa
+
+from leitura_csv import NULOS_CSV, ler_csv_arrow
+
+print("=" * 80)
+print("TESTE DE PARIDADE - ler_csv_arrow x pd.read_csv")
+print("=" * 80)
+
+nulos = sorted(NULOS_CSV)
+linhas = len(nulos)
+conteudo = pd.DataFrame({
+    "chave_codigo": [str(10**43 + i) for i in range(linhas)],
+    "texto": nulos,
+    "texto_misto": [valor if i % 2 else "foo" for i, valor in enumerate(nulos)],
+    "numero": [valor if i % 3 == 0 else str(i * 1.5) for i, valor in enumerate(nulos)],
+    "data": ["2024-01-02"] * linhas,
+    "vazia": [""] * linhas,
+})
+falhas = 0
+
+with tempfile.TemporaryDirectory() as pasta:
+    for encoding in ("utf-8", "utf-8-sig"):
+        caminho = Path(pasta) / f"teste_{encoding}.csv"
+        with open(caminho, "w", encoding=encoding, newline="") as arquivo:
+            arquivo.write(";".join(conteudo.columns) + "\n")
+            for linha in conteudo.itertuples(index=False):
+                arquivo.write(";".join(linha) + "\n")
+
+        esperado = pd.read_csv(
+            caminho, sep=";", dtype={"chave_codigo": str}, encoding=encoding, low_memory=False
+        )
+        obtido = ler_csv_arrow(caminho, {"chave_codigo": pa.string()})
+        try:
+            pd.testing.assert_frame_equal(obtido, esperado)
+            print(f"  ✓ {encoding}: {len(obtido)} linhas iguais ao pd.read_csv")
+        except AssertionError as e:
+            falhas += 1
+            print(f"  ✗ {encoding}: {e}")
+
+print("\n" + "=" * 80)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] ler_csv_arrow equivalente ao pd.read_csv")
@@ -4,11 +4,35 @@ VALIDAÇÃO COMPLETA DAS ETAPAS 14, 15 E 16
 Verifica se as novas etapas foram integradas corretamente ao pipeline
 """
 
+import importlib.util
+import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 
+
+@lru_cache(maxsize=None)
+def _listar_pasta(pasta: Path) -> dict:
+    """Entradas de ``pasta`` por nome: uma listagem por pasta em vez de um stat por arquivo."""
+    try:
+        with os.scandir(pasta) as entradas:
+            return {entrada.name: entrada for entrada in entradas}
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+
+
+def _stat_arquivo(path: Path):
+    """``os.stat_result`` de ``path`` (segue links, como o pathlib) ou None se não existir."""
+    entrada = _listar_pasta(path.parent).get(path.name)
+    if entrada is None:
+        return None
+    try:
+        return entrada.stat(follow_symlinks=True)
+    except FileNotFoundError:
+        return None
+
 print("="*80)
 print("VALIDACAO COMPLETA - ETAPAS 14, 15 E 16 NO PIPELINE")
 print("="*80)
@@ -24,8 +48,7 @@ modulos_esperados = [
 
 modulos_ok = 0
 for arquivo, descricao in modulos_esperados:
-    path = BASE_DIR / arquivo
-    if path.exists():
+    if _stat_arquivo(BASE_DIR / arquivo) is not None:
         print(f"  ✓ {descricao:<40} {arquivo}")
         modulos_ok += 1
     else:
@@ -73,9 +96,9 @@ arquivos_entrada = [
 
 entrada_ok = 0
 for arquivo, descricao in arquivos_entrada:
-    path = BASE_DIR / arquivo
-    if path.exists():
-        tamanho = path.stat().st_size / (1024 * 1024)
+    stat_arquivo = _stat_arquivo(BASE_DIR / arquivo)
+    if stat_arquivo is not None:
+        tamanho = stat_arquivo.st_size / (1024 * 1024)
         print(f"  ✓ {descricao:<30} {arquivo} ({tamanho:.2f} MB)")
         entrada_ok += 1
     else:
@@ -89,9 +112,9 @@ outputs_esperados = [
 
 outputs_ok = 0
 for arquivo, descricao in outputs_esperados:
-    path = BASE_DIR / arquivo
-    if path.exists():
-        tamanho = path.stat().st_size / (1024 * 1024)
+    stat_arquivo = _stat_arquivo(BASE_DIR / arquivo)
+    if stat_arquivo is not None:
+        tamanho = stat_arquivo.st_size / (1024 * 1024)
         print(f"  ✓ {descricao:<30} {arquivo} ({tamanho:.2f} MB)")
         outputs_ok += 1
     else:
@@ -110,9 +133,9 @@ outputs_novos = [
 
 novos_ok = 0
 for arquivo, descricao in outputs_novos:
-    path = BASE_DIR / arquivo
-    if path.exists():
-        tamanho = path.stat().st_size / (1024 * 1024)
+    stat_arquivo = _stat_arquivo(BASE_DIR / arquivo)
+    if stat_arquivo is not None:
+        tamanho = stat_arquivo.st_size / (1024 * 1024)
         print(f"  ✓ {descricao:<30} {arquivo} ({tamanho:.2f} MB)")
         novos_ok += 1
     else:
@@ -123,15 +146,12 @@ print("\n6. Verificando dependências críticas...")
 deps = ['pandas', 'numpy', 'rapidfuzz', 'tqdm', 'zipfile']
 
 deps_ok = 0
+# find_spec só localiza o pacote, sem executá-lo (importar pandas custa segundos)
 for dep in deps:
-    try:
-        if dep == 'zipfile':
-            import zipfile
-        else:
-            __import__(dep)
+    if importlib.util.find_spec(dep) is not None:
         print(f"  ✓ {dep}")
         deps_ok += 1
-    except ImportError:
+    else:
         print(f"  ✗ {dep} (NÃO INSTALADO)")
 
 # 7. Resumo final